@@ -18,8 +18,40 @@ import requests
 import random
 import copy
 
+from http.cookiejar import DefaultCookiePolicy
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlencode
 
+# (connect, read) seconds applied to every request that does not pass its own timeout
+DEFAULT_TIMEOUT = (5, 20)
+
+
+class PooledSession(requests.Session):
+    """
+    requests.Session with a keep-alive connection pool and a default timeout.
+    Reusing one session per account avoids a TCP/TLS handshake on every API call.
+    """
+
+    def __init__(self, pool_connections=4, pool_maxsize=16):
+        super().__init__()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+
+def _anonymous_session() -> PooledSession:
+    # Shared by cookie-less requests; Set-Cookie responses are rejected so no identity leaks in
+    session = PooledSession()
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+_ANONYMOUS_SESSION = _anonymous_session()
+
 def get_ua():
     first_num = random.randint(55, 62)
     third_num = random.randint(0, 3200)
@@ -53,7 +85,7 @@ class BuffAccount:
     """
 
     def __init__(self, buffcookie, user_agent=get_ua()):
-        self.session = requests.session()
+        self.session = PooledSession()
         # Ensure all subsequent requests carry UA and Cookie
         self.session.headers = {'User-Agent': user_agent, 'Cookie': buffcookie}
         try:
@@ -170,8 +202,8 @@ class BuffAccount:
             return json.loads(self.session.get('https://buff.163.com/api/market/goods/sell_order', params=params,
                                                headers=get_random_header(), proxies=proxy).text).get('data')
         else:
-            return json.loads(requests.get('https://buff.163.com/api/market/goods/sell_order', params=params,
-                                           headers=get_random_header(), proxies=proxy).text).get('data')
+            return json.loads(_ANONYMOUS_SESSION.get('https://buff.163.com/api/market/goods/sell_order', params=params,
+                                                     headers=get_random_header(), proxies=proxy).text).get('data')
 
     def get_available_payment_methods(self, sell_order_id, goods_id, price, game_name='csgo') -> dict:
         """
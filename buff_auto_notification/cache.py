@@ -1,27 +1,62 @@
 import os
 import json
-import requests
+import asyncio
 import hashlib
 import shutil
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+import aiofiles
 from datetime import datetime, timedelta
 
+from fileio import json_loads, json_dumps, open_buffered, atomic_write, fsync_dir, path_lock
+from logutil import get_logger
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+log = get_logger('cache')
+
+# Below this size a full parse is cheaper than setting up the streaming parser
+STREAMING_THRESHOLD_BYTES = 10 * 1024
+# Icon bodies are copied in filesystem-aligned 64KB chunks
+ICON_CHUNK_SIZE = 64 * 1024
+
+
+@functools.lru_cache(maxsize=4096)
+def _hash_name(market_hash_name: str) -> str:
+    """Returns the md5 hex digest used as the cache filename for a market_hash_name."""
+    return hashlib.md5(market_hash_name.encode('utf-8')).hexdigest()
+
+
 class MarketCache:
     """
     A class to cache JSON data and related images from an API.
-    Supports unified caching, loading, incremental backups, and cleanup.
+    Each item is stored as a static header JSON plus an append-only NDJSON snapshot log.
     """
 
-    def __init__(self, cache_dir='market_cache'):
+    def __init__(self, cache_dir='market_cache', icon_concurrency=8):
         """
         Initializes the cache class, creating necessary directories.
 
         Args:
             cache_dir (str): The name of the main cache directory.
+            icon_concurrency (int): Maximum number of concurrent icon downloads.
         """
         self.cache_dir = cache_dir
+        self.icon_concurrency = max(1, int(icon_concurrency))
         self.json_dir = os.path.join(self.cache_dir, 'json')
         self.image_dir = os.path.join(self.cache_dir, 'images')
-        # Backup directory removed per new design (history is embedded in each JSON)
+        # Parsed file contents reused while a file is unchanged: {key: ((mtime_ns, size), value)}
+        self._parse_cache = {}
+        # Reader threads shared by every load_cache call; created on first multi-entry load
+        self._load_pool = None
+        self._load_pool_lock = threading.Lock()
+        # Backup directory removed per new design (history lives in each item's snapshot log)
         os.makedirs(self.json_dir, exist_ok=True)
         os.makedirs(self.image_dir, exist_ok=True)
         
@@ -57,46 +92,98 @@ class MarketCache:
         
         market_hash_name = item.get('market_hash_name')
         if market_hash_name:
-            return hashlib.md5(market_hash_name.encode('utf-8')).hexdigest()
+            return _hash_name(market_hash_name)
 
         raise ValueError("Item has no 'id' or 'market_hash_name' for caching.")
 
-    def _download_icon(self, item: dict, filename_base: str) -> bool:
+    def _icon_path(self, item: dict, filename_base: str):
         """
-        Downloads the item's icon and saves it locally.
-        
+        Resolves the icon URL and local file path for an item.
+
         Args:
             item (dict): The item data.
             filename_base (str): The base name for the image file (without extension).
+
+        Returns:
+            tuple: (icon_url, filepath), or (None, None) if the item has no icon URL.
         """
         icon_url = item.get('goods_info', {}).get('icon_url')
         if not icon_url:
-            print(f"No icon URL for item '{item.get('name', 'N/A')}', skipping download.")
-            return
-            
+            return None, None
+
         try:
             file_extension = os.path.splitext(icon_url.split('?')[0])[1] or '.jpg'
             filepath = os.path.join(self.image_dir, f'{filename_base}{file_extension}')
         except IndexError:
             filepath = os.path.join(self.image_dir, f'{filename_base}.jpg')
-        
-        if os.path.exists(filepath):
-            return False
-            
+        return icon_url, filepath
+
+    async def _download_icon_async(self, session, sem, icon_url: str, filepath: str) -> bool:
+        """
+        Downloads an icon and saves it locally.
+
+        Args:
+            session (aiohttp.ClientSession): The shared HTTP session for this batch.
+            sem (asyncio.Semaphore): Bounds the number of concurrent downloads.
+            icon_url (str): The remote icon URL.
+            filepath (str): The local destination path.
+
+        Returns:
+            bool: True if a new icon was downloaded.
+        """
+        # Written under a temporary name so a failed transfer never looks like a cached icon.
+        # The name is unique per process and thread (each upsert batch runs its own event loop,
+        # and a batch fetches each file once), so concurrent batches never share a temp file.
+        part_path = f'{filepath}.{os.getpid()}.{threading.get_ident()}.part'
         try:
-            response = requests.get(icon_url, stream=True, timeout=10)
-            response.raise_for_status()
-            
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            print(f"Icon saved: {filepath}")
+            async with sem:
+                async with session.get(icon_url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                    response.raise_for_status()
+                    async with aiofiles.open(part_path, 'wb') as f:
+                        async for chunk in response.content.iter_chunked(ICON_CHUNK_SIZE):
+                            await f.write(chunk)
+            os.replace(part_path, filepath)
+            log.debug("Icon saved: %s", filepath)
             return True
-            
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to download icon '{icon_url}': {e}")
+
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            log.warning(f"Failed to download icon '{icon_url}': {e}")
+            if os.path.exists(part_path):
+                os.remove(part_path)
             return False
 
+    async def _download_icons(self, jobs: list):
+        """
+        Downloads missing icons for a batch of items concurrently over a single session.
+
+        Each distinct icon file is fetched at most once per batch, and icons
+        already on disk are never requested again.
+
+        Args:
+            jobs (list): A list of (item, filename_base) tuples.
+        """
+        pending = {}
+        for item, filename_base in jobs:
+            icon_url, filepath = self._icon_path(item, filename_base)
+            if not icon_url:
+                log.debug("No icon URL for item '%s', skipping download.", item.get('name', 'N/A'))
+                continue
+            if filepath in pending or os.path.exists(filepath):
+                continue
+            pending[filepath] = icon_url
+
+        if not pending:
+            return
+
+        sem = asyncio.Semaphore(self.icon_concurrency)
+        # One connection pool per batch, so sockets are reused across items
+        connector = aiohttp.TCPConnector(limit=16, ttl_dns_cache=300)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await asyncio.gather(*[
+                self._download_icon_async(session, sem, icon_url, filepath)
+                for filepath, icon_url in pending.items()
+            ])
+
     def upsert_cache(self, items: list):
         """
         A unified method to insert new data or update existing data in the cache.
@@ -104,66 +191,139 @@ class MarketCache:
         Args:
             items (list): A list of item dictionaries from the API response.
         """
-        print("Starting cache processing...")
-        last_icon_download_time = None
-        icon_delay = getattr(self, 'icon_download_delay_seconds', 0) or 0
+        log.debug("Starting cache processing...")
+        jobs = []
         for item in items:
             try:
-                filename_base = self._get_filename(item)
-                json_filepath = os.path.join(self.json_dir, f'{filename_base}.json')
-                
-                # Attempt icon download and respect delay between downloads in a single batch
-                did_download = self._download_icon(item, filename_base)
-                if did_download and icon_delay > 0:
-                    # Enforce spacing between downloads
-                    import time as _time
-                    if last_icon_download_time is None:
-                        last_icon_download_time = _time.time()
-                    else:
-                        elapsed = _time.time() - last_icon_download_time
-                        if elapsed < icon_delay:
-                            _time.sleep(icon_delay - elapsed)
-                        last_icon_download_time = _time.time()
+                jobs.append((item, self._get_filename(item)))
+            except ValueError as e:
+                log.warning(f"Skipping item due to error: {e}")
+
+        # Icons are fetched concurrently up front; the semaphore replaces per-download sleeps
+        if jobs:
+            asyncio.run(self._download_icons(jobs))
+
+        # Set when this batch renamed a file into json_dir
+        renamed = False
+        for item, filename_base in jobs:
+            try:
+                base_path = os.path.join(self.json_dir, filename_base)
+                static_filepath = f'{base_path}.static.json'
+                log_filepath = f'{base_path}.snapshots.ndjson'
 
                 # Build static and dynamic snapshot
-                now_iso = datetime.now().isoformat()
+                now = datetime.now()
+                now_ms = int(now.timestamp() * 1000)
                 dynamic_snapshot = {key: item.get(key) for key in self.dynamic_keys if key in item}
 
-                if os.path.exists(json_filepath):
-                    # Load existing unified structure and append snapshot indexed by time
-                    with open(json_filepath, 'r', encoding='utf-8') as f:
-                        existing = json.load(f)
+                # Concurrent checks can upsert the same item; one writer per item at a time
+                with path_lock(base_path):
+                    if not os.path.exists(static_filepath):
+                        legacy_filepath = f'{base_path}.json'
+                        if os.path.exists(legacy_filepath):
+                            renamed |= self._migrate_legacy(legacy_filepath, item, static_filepath, log_filepath)
+                        else:
+                            # Static fields are written once; snapshots only ever append
+                            static_part = {k: item.get(k) for k in self.static_keys if k in item}
+                            atomic_write(static_filepath, json_dumps(static_part))
+                            renamed = True
+                            log.debug("New JSON file saved: %s", static_filepath)
 
-                    if not (isinstance(existing, dict) and isinstance(existing.get('static'), dict) and isinstance(existing.get('snapshots'), dict)):
-                        # Non-unified structure detected; overwrite with unified format using current item only
-                        static_part = {k: item.get(k) for k in self.static_keys if k in item}
-                        existing = {'static': static_part, 'snapshots': {}}
+                    line = json_dumps({'ts': now_ms, 'cached_at': now.isoformat(), **dynamic_snapshot}) + b'\n'
+                    if _ends_torn(log_filepath):
+                        # Terminate a torn line from an interrupted append so this snapshot starts a fresh line
+                        line = b'\n' + line
+                    with open_buffered(log_filepath, 'ab') as f:
+                        f.write(line)
+                log.debug("Appended snapshot to cache log: %s", log_filepath)
 
-                    existing['snapshots'][now_iso] = dynamic_snapshot
+            except Exception as e:
+                log.error(f"An unexpected error occurred while processing item '{item.get('name', 'N/A')}': {e}")
 
-                    with open(json_filepath, 'w', encoding='utf-8') as f:
-                        json.dump(existing, f, ensure_ascii=False, indent=4)
-                    print(f"Appended snapshot to cache file: {json_filepath}")
+        # One directory sync per batch persists the new directory entries. It only makes
+        # the renames durable, not the renamed files' contents, and is skipped for
+        # batches that merely appended snapshots.
+        if renamed:
+            fsync_dir(self.json_dir)
+        log.debug("Cache processing finished.")
 
-                else:
-                    # Create new structure with static at front and time-indexed dynamic snapshots
-                    static_part = {k: item.get(k) for k in self.static_keys if k in item}
-                    content = {
-                        'static': static_part,
-                        'snapshots': {
-                            now_iso: dynamic_snapshot
-                        }
-                    }
-                    with open(json_filepath, 'w', encoding='utf-8') as f:
-                        json.dump(content, f, ensure_ascii=False, indent=4)
-                    print(f"New JSON file saved: {json_filepath}")
-            
-            except ValueError as e:
-                print(f"Skipping item due to error: {e}")
-            except Exception as e:
-                print(f"An unexpected error occurred while processing item '{item.get('name', 'N/A')}': {e}")
-        
-        print("Cache processing finished.")
+    def _migrate_legacy(self, legacy_filepath: str, item: dict, static_filepath: str, log_filepath: str) -> bool:
+        """
+        Splits a legacy unified JSON file into a static header and a snapshot log.
+
+        Callers hold the item's path_lock. If another writer already migrated
+        the entry, the existing split files are left untouched.
+
+        Args:
+            legacy_filepath (str): Path of the unified '{static, snapshots}' file.
+            item (dict): The current item, used when the legacy file is not unified.
+            static_filepath (str): Destination of the static header JSON.
+            log_filepath (str): Destination of the NDJSON snapshot log.
+
+        Returns:
+            bool: True if files were written, False if there was nothing left to migrate.
+        """
+        if os.path.exists(static_filepath):
+            return False
+        try:
+            existing = _read_json(legacy_filepath)
+        except FileNotFoundError:
+            return False
+
+        if isinstance(existing, dict) and isinstance(existing.get('static'), dict) and isinstance(existing.get('snapshots'), dict):
+            static_part = existing['static']
+            snapshots = existing['snapshots']
+        else:
+            # Non-unified structure detected; start over from the current item only
+            static_part = {k: item.get(k) for k in self.static_keys if k in item}
+            snapshots = {}
+
+        lines = []
+        for ts in sorted(snapshots):
+            try:
+                ts_ms = _to_ms(ts)
+            except ValueError:
+                continue
+            lines.append(json_dumps({'ts': ts_ms, 'cached_at': ts, **snapshots[ts]}) + b'\n')
+        atomic_write(log_filepath, b''.join(lines))
+        atomic_write(static_filepath, json_dumps(static_part))
+        os.remove(legacy_filepath)
+        log.info(f"Migrated legacy cache file: {legacy_filepath}")
+        return True
+
+    def _latest_snapshot(self, log_filepath: str, start_ms: int = None, end_ms: int = None):
+        """
+        Finds the most recent snapshot within a time window by reading the log from its tail.
+
+        Args:
+            log_filepath (str): Path of the NDJSON snapshot log.
+            start_ms (int, optional): Earliest accepted snapshot time, in epoch milliseconds.
+            end_ms (int, optional): Latest accepted snapshot time, in epoch milliseconds.
+
+        Returns:
+            tuple: (cached_at, snapshot) or None if no snapshot falls within the window.
+        """
+        for line in _iter_lines_reversed(log_filepath):
+            if not line.strip():
+                continue
+            try:
+                snap = json_loads(line)
+                raw_ts = snap.pop('ts')
+                ts_ms = _to_ms(raw_ts)
+            except (ValueError, KeyError, TypeError, AttributeError):
+                # Skips a torn trailing line left by an interrupted append
+                continue
+            if end_ms is not None and ts_ms > end_ms:
+                continue
+            if start_ms is not None and ts_ms < start_ms:
+                # The log is append-only, so every earlier line is older still
+                return None
+            # Lines written before epoch keys carry their ISO time in 'ts' itself
+            cached_at = snap.pop('cached_at', raw_ts if isinstance(raw_ts, str) else None)
+            # Unix seconds let callers test staleness without parsing the ISO string
+            snap['cached_at_ts'] = ts_ms / 1000
+            return cached_at, snap
+        return None
 
     def load_cache(self, start_time: str = None, end_time: str = None, keys: list = None, limit: int = None, offset: int = 0) -> list:
         """
@@ -179,8 +339,6 @@ class MarketCache:
         Returns:
             list: A list of loaded cache items.
         """
-        loaded_items = []
-        
         filenames_to_load = None
         if keys:
             filenames_to_load = set()
@@ -190,57 +348,260 @@ class MarketCache:
                     int_key = int(key)
                     filenames_to_load.add(str(int_key))
                 except (ValueError, TypeError):
-                    # If not a number, treat as market_hash_name
+                    # If not a number, treat as market_hash_name (stored under its hash)
                     filenames_to_load.add(key)
+                    filenames_to_load.add(_hash_name(key))
         
-        start_dt = datetime.fromisoformat(start_time) if start_time else None
-        end_dt = datetime.fromisoformat(end_time) if end_time else None
+        start_ms = _to_ms(start_time) if start_time else None
+        end_ms = _to_ms(end_time) if end_time else None
 
-        file_list = sorted(os.listdir(self.json_dir))
-        count = 0
-        items_found = 0
+        # Map each cache entry to its layout: split static/log files, or a legacy unified JSON
+        entries = {}
+        with os.scandir(self.json_dir) as it:
+            for entry in it:
+                filename = entry.name
+                if not filename.endswith('.json') or not entry.is_file(follow_symlinks=False):
+                    continue
+                if filename.endswith('.static.json'):
+                    entries[filename[:-len('.static.json')]] = ('split', entry.path)
+                else:
+                    entries.setdefault(filename[:-len('.json')], ('legacy', entry.path))
 
-        for filename in file_list:
-            if not filename.endswith('.json'):
-                continue
-            
-            if filenames_to_load and os.path.splitext(filename)[0] not in filenames_to_load:
-                continue
+        names = sorted(name for name in entries if not filenames_to_load or name in filenames_to_load)
 
-            filepath = os.path.join(self.json_dir, filename)
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    # Only support unified structure during development
-                    if not (isinstance(data, dict) and isinstance(data.get('static'), dict) and isinstance(data.get('snapshots'), dict)):
-                        continue
+        def load_one(name):
+            layout, filepath = entries[name]
+            return self._load_one(name, layout, filepath, start_ms, end_ms)
 
-                    snapshots = data.get('snapshots', {})
-                    if not snapshots:
-                        continue
-                    # Choose latest snapshot by time within window
-                    sorted_ts = sorted(snapshots.keys())
+        if len(names) > 1:
+            # File reads overlap across threads; map() keeps results in filename order
+            results = list(self._get_load_pool().map(load_one, names))
+        else:
+            results = [load_one(name) for name in names]
+
+        loaded_items = [merged for merged in results if merged is not None]
+        end = offset + limit if limit else None
+        return loaded_items[offset:end]
+
+    def _get_load_pool(self) -> ThreadPoolExecutor:
+        """Returns the executor used for parallel cache reads, creating it on first use."""
+        with self._load_pool_lock:
+            if self._load_pool is None:
+                self._load_pool = ThreadPoolExecutor(
+                    max_workers=min(32, (os.cpu_count() or 4) * 4), thread_name_prefix='cache-load'
+                )
+            return self._load_pool
+
+    def _load_one(self, name: str, layout: str, filepath: str, start_ms: int = None, end_ms: int = None):
+        """
+        Loads a single cache entry and merges its static part with the selected snapshot.
+
+        Args:
+            name (str): The entry's filename base (item ID or name hash).
+            layout (str): 'split' for static/log files, 'legacy' for a unified JSON.
+            filepath (str): Path of the static header or legacy JSON file.
+            start_ms (int, optional): Earliest accepted snapshot time, in epoch milliseconds.
+            end_ms (int, optional): Latest accepted snapshot time, in epoch milliseconds.
+
+        Returns:
+            Optional[dict]: The merged item, or None if nothing usable was found.
+        """
+        try:
+            if layout == 'split':
+                static_part = self._cached(filepath, filepath, lambda: _read_json(filepath))
+                log_filepath = f"{filepath[:-len('.static.json')]}.snapshots.ndjson"
+                try:
+                    selected = self._cached(
+                        (log_filepath, start_ms, end_ms), log_filepath,
+                        lambda: self._latest_snapshot(log_filepath, start_ms, end_ms)
+                    )
+                except FileNotFoundError:
                     selected = None
-                    for ts in reversed(sorted_ts):
-                        try:
-                            dt = datetime.fromisoformat(ts)
-                        except Exception:
-                            continue
-                        if (start_dt and dt < start_dt) or (end_dt and dt > end_dt):
-                            continue
-                        selected = (ts, snapshots[ts])
-                        break
-                    if not selected:
+            else:
+                legacy = self._cached(
+                    (filepath, start_ms, end_ms), filepath,
+                    lambda: self._load_legacy(filepath, start_ms, end_ms)
+                )
+                # Only support unified structure during development
+                if legacy is None:
+                    return None
+                static_part, selected = legacy
+        except (json.JSONDecodeError, ValueError, OSError) as e:
+            log.warning(f"Could not load or parse cache entry {name}: {e}")
+            return None
+
+        if not selected:
+            return None
+        ts, snap = selected
+        return {**static_part, **snap, 'cached_at': ts}
+
+    def export_pretty(self, path: str, **load_kwargs) -> int:
+        """
+        Writes cached items as indented JSON for human inspection.
+
+        Cache files themselves are compact; this produces a readable copy.
+
+        Args:
+            path (str): Destination file path.
+            **load_kwargs: Filters passed through to load_cache.
+
+        Returns:
+            int: The number of items exported.
+        """
+        items = self.load_cache(**load_kwargs)
+        atomic_write(path, json_dumps(items, pretty=True))
+        return len(items)
+
+    def _cached(self, key, filepath: str, loader):
+        """
+        Returns a previously parsed value while the file it came from is unchanged.
+
+        Args:
+            key: The cache key (the path, plus the time window where it matters).
+            filepath (str): The file whose mtime and size validate the entry.
+            loader (callable): Produces the value when the entry is missing or stale.
+
+        Returns:
+            The cached or freshly loaded value.
+        """
+        st = os.stat(filepath)
+        signature = (st.st_mtime_ns, st.st_size)
+        entry = self._parse_cache.get(key)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        value = loader()
+        self._parse_cache[key] = (signature, value)
+        return value
+
+    def _load_legacy(self, filepath: str, start_ms: int = None, end_ms: int = None):
+        """
+        Reads a legacy unified JSON file, streaming it with ijson when it is large.
+
+        Args:
+            filepath (str): Path of the unified '{static, snapshots}' file.
+            start_ms (int, optional): Earliest accepted snapshot time, in epoch milliseconds.
+            end_ms (int, optional): Latest accepted snapshot time, in epoch milliseconds.
+
+        Returns:
+            tuple: (static, selected) where selected is (ts, snapshot) or None,
+            or None if the file is not in the unified structure.
+        """
+        if ijson is None or os.path.getsize(filepath) < STREAMING_THRESHOLD_BYTES:
+            data = _read_json(filepath)
+            if not (isinstance(data, dict) and isinstance(data.get('static'), dict) and isinstance(data.get('snapshots'), dict)):
+                return None
+            return data['static'], self._select_snapshot(data['snapshots'], start_ms, end_ms)
+
+        try:
+            with open_buffered(filepath, 'rb') as f:
+                static_part = next(ijson.items(f, 'static', use_float=True), None)
+                if not isinstance(static_part, dict):
+                    return None
+                f.seek(0)
+                # Only timestamps are compared; a single candidate snapshot is kept in memory
+                selected = None
+                selected_ms = None
+                for ts, snap in ijson.kvitems(f, 'snapshots', use_float=True):
+                    try:
+                        ts_ms = _to_ms(ts)
+                    except ValueError:
                         continue
-                    ts, snap = selected
-                    merged = {**data.get('static', {}), **snap, 'cached_at': ts}
-                    if count >= offset:
-                        loaded_items.append(merged)
-                        items_found += 1
-                        if limit and items_found >= limit:
-                            break
-                    count += 1
-            except (json.JSONDecodeError, ValueError) as e:
-                print(f"Warning: Could not load or parse file {filename}: {e}")
-        
-        return loaded_items
\ No newline at end of file
+                    if not _in_window(ts_ms, start_ms, end_ms):
+                        continue
+                    if selected_ms is None or ts_ms > selected_ms:
+                        selected, selected_ms = (ts, snap), ts_ms
+        except ijson.JSONError as e:
+            raise ValueError(e)
+        if selected is not None:
+            ts, snap = selected
+            selected = (ts, {**snap, 'cached_at_ts': selected_ms / 1000})
+        return static_part, selected
+
+    def _select_snapshot(self, snapshots: dict, start_ms: int = None, end_ms: int = None):
+        """
+        Chooses the latest snapshot by time within a window from a legacy snapshots dict.
+
+        Args:
+            snapshots (dict): Snapshots keyed by ISO timestamp.
+            start_ms (int, optional): Earliest accepted snapshot time, in epoch milliseconds.
+            end_ms (int, optional): Latest accepted snapshot time, in epoch milliseconds.
+
+        Returns:
+            tuple: (ts, snapshot) or None if no snapshot falls within the window.
+        """
+        for ts in sorted(snapshots, reverse=True):
+            try:
+                ts_ms = _to_ms(ts)
+            except ValueError:
+                continue
+            if _in_window(ts_ms, start_ms, end_ms):
+                return ts, {**snapshots[ts], 'cached_at_ts': ts_ms / 1000}
+        return None
+
+
+def _ends_torn(filepath: str) -> bool:
+    """True if a non-empty file does not end with a newline."""
+    try:
+        with open(filepath, 'rb') as f:
+            if f.seek(0, os.SEEK_END) == 0:
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b'\n'
+    except FileNotFoundError:
+        return False
+
+
+def _read_json(filepath: str):
+    """Reads and parses a whole JSON file."""
+    with open_buffered(filepath, 'rb') as f:
+        return json_loads(f.read())
+
+
+def _to_ms(ts) -> int:
+    """
+    Converts a snapshot timestamp to epoch milliseconds.
+
+    Args:
+        ts: Epoch milliseconds, or an ISO format string as used by older cache files.
+
+    Returns:
+        int: The timestamp in epoch milliseconds.
+
+    Raises:
+        ValueError: If the timestamp cannot be interpreted.
+    """
+    if isinstance(ts, str):
+        return int(datetime.fromisoformat(ts).timestamp() * 1000)
+    if isinstance(ts, (int, float)):
+        return int(ts)
+    raise ValueError(f"Invalid snapshot timestamp: {ts!r}")
+
+
+def _in_window(ts_ms: int, start_ms: int = None, end_ms: int = None) -> bool:
+    """Checks whether an epoch-millisecond timestamp falls inside an optional window."""
+    return (start_ms is None or ts_ms >= start_ms) and (end_ms is None or ts_ms <= end_ms)
+
+
+def _iter_lines_reversed(filepath: str, chunk_size: int = 64 * 1024):
+    """
+    Yields the lines of a file from last to first, reading fixed-size chunks from the end.
+
+    Args:
+        filepath (str): The file to read.
+        chunk_size (int): Bytes read per backwards step.
+    """
+    # Reads are already chunked, so skip the extra buffer layer
+    with open(filepath, 'rb', buffering=0) as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        tail = b''
+        while pos > 0:
+            step = min(chunk_size, pos)
+            pos -= step
+            f.seek(pos)
+            lines = (f.read(step) + tail).split(b'\n')
+            # The first piece may continue in the previous chunk
+            tail = lines.pop(0)
+            yield from reversed(lines)
+        if tail:
+            yield tail
@@ -22,7 +22,6 @@ CLI 工具：根据用户输入的名称搜索 Buff 市场物品，并在选择
 
 import os
 import sys
-import json
 import argparse
 from datetime import datetime
 
@@ -35,10 +34,12 @@ CACHE_JSON_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "
 # 兼容直接运行时的模块导入
 try:
     from BuffApiPublic import BuffAccount
+    from fileio import json_dumps, atomic_write
 except Exception:
     # 支持从项目根目录执行
     sys.path.append(os.path.dirname(__file__))
     from BuffApiPublic import BuffAccount
+    from fileio import json_dumps, atomic_write
 
 
 def pick_cookie(args_cookie: str) -> str:
@@ -118,8 +119,7 @@ def save_result(goods_id: str, keyword: str, game: str, selected_name: str, sear
         "detail": detail_payload,
         "timestamp": datetime.now().isoformat(),
     }
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(content, f, ensure_ascii=False, indent=2)
+    atomic_write(out_path, json_dumps(content, pretty=True))
     return out_path
 
 
@@ -0,0 +1,273 @@
+"""
+Shared file I/O helpers for the cache, CLI tools and user configs.
+
+JSON is handled by orjson when it is installed, falling back to the
+standard library json module otherwise. Both paths work on bytes.
+YAML goes through the libyaml C loader/dumper when PyYAML was built with it.
+"""
+
+import os
+import copy
+import json
+import math
+import types
+import functools
+import threading
+
+import yaml
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+Dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+# Parsed YAML documents keyed by path: {path: ((st_mtime_ns, st_size), data)}
+_yaml_cache = {}
+
+# Per-file locks serializing read-modify-write cycles: {abspath: Lock}
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+
+# Matches the chunk size used for sequential reads of larger cache files
+BUFFER_SIZE = 64 * 1024
+
+
+def open_buffered(path, mode: str = 'rb'):
+    """
+    Opens a file with a 64KB buffer instead of the interpreter default.
+
+    Args:
+        path: The file path.
+        mode (str): The file mode, normally binary ('rb', 'wb', 'ab').
+
+    Returns:
+        The opened file object.
+    """
+    return open(path, mode, buffering=BUFFER_SIZE)
+
+
+def atomic_write(path, data: bytes, fsync: bool = False):
+    """
+    Replaces a file's contents atomically via a temporary file and os.replace.
+
+    Readers see either the old or the new file, never a torn one. The
+    temporary name is unique per process and thread, so concurrent
+    writers of the same path cannot clobber each other's temp file.
+
+    Args:
+        path: The destination file path.
+        data (bytes): The complete new file contents.
+        fsync (bool): Flush the data to disk before the rename.
+    """
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open_buffered(tmp_path, 'wb') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def path_lock(path) -> threading.Lock:
+    """
+    Returns the process-wide lock for a file path, creating it on first use.
+
+    Hold it across a load, modify and write of the same file so concurrent
+    request threads cannot lose each other's updates.
+
+    Args:
+        path: The file path.
+
+    Returns:
+        threading.Lock: The lock shared by every caller using this path.
+    """
+    key = os.path.abspath(path)
+    with _path_locks_guard:
+        lock = _path_locks.get(key)
+        if lock is None:
+            lock = _path_locks[key] = threading.Lock()
+        return lock
+
+
+def fsync_dir(dirpath):
+    """
+    Flushes a directory entry table so preceding renames survive a crash.
+
+    This is a best-effort no-op on platforms that cannot open directories.
+
+    Args:
+        dirpath: The directory to flush.
+    """
+    try:
+        fd = os.open(dirpath, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def json_loads(data: bytes):
+    """
+    Parses JSON from bytes (or str).
+
+    Args:
+        data (bytes): The raw JSON document.
+
+    Returns:
+        The decoded Python object.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj, pretty: bool = False) -> bytes:
+    """
+    Serializes an object to UTF-8 encoded JSON bytes.
+
+    Args:
+        obj: The object to serialize.
+        pretty (bool): Indent the output for human readers.
+
+    Returns:
+        bytes: The encoded JSON document.
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if pretty else None).encode('utf-8')
+
+
+def load_yaml(path):
+    """
+    Loads a YAML file, reusing a previous parse while its mtime is unchanged.
+
+    Parses are cached in-process and, when the document survives a JSON
+    round trip unchanged, in a sidecar next to the file (``<path>.json``) so
+    a restarted process can skip YAML parsing too. Both caches are keyed on
+    the file's mtime and size.
+
+    Args:
+        path: The YAML file path.
+
+    Returns:
+        A private copy of the parsed document, safe for the caller to mutate.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    signature = _file_signature(path)
+    cached = _yaml_cache.get(path)
+    if cached is None or cached[0] != signature:
+        data = _read_yaml_sidecar(path, signature)
+        if data is None:
+            with open_buffered(path, 'rb') as f:
+                data = yaml.load(f, Loader=Loader)
+            _write_yaml_sidecar(path, signature, data)
+        cached = (signature, data)
+        _yaml_cache[path] = cached
+    return copy.deepcopy(cached[1])
+
+
+def load_config(path):
+    """
+    Loads a read-only YAML config shared by every caller in the process.
+
+    The parse is memoized on the file's mtime, so edits to the config are
+    picked up by long-running processes on the next call.
+
+    Args:
+        path: The YAML config path.
+
+    Returns:
+        MappingProxyType: A read-only view of the parsed config.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    return _load_config_cached(path, os.stat(path).st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_config_cached(path, mtime_ns: int):
+    with open_buffered(path, 'rb') as f:
+        return types.MappingProxyType(yaml.load(f, Loader=Loader) or {})
+
+
+def dump_yaml(path, data, fsync: bool = False, **dump_kwargs):
+    """
+    Writes a YAML file atomically and refreshes its cached parse.
+
+    Args:
+        path: The YAML file path.
+        data: The document to write.
+        fsync (bool): Flush the new contents to disk before they replace the old file.
+        **dump_kwargs: Extra options for yaml.dump (e.g. sort_keys, allow_unicode).
+    """
+    atomic_write(path, yaml.dump(data, Dumper=Dumper, **dump_kwargs).encode('utf-8'), fsync=fsync)
+    signature = _file_signature(path)
+    _yaml_cache[path] = (signature, copy.deepcopy(data))
+    _write_yaml_sidecar(path, signature, data)
+
+
+def _file_signature(path) -> tuple:
+    """Returns (st_mtime_ns, st_size); the size catches rewrites within one coarse mtime tick."""
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _json_safe(obj) -> bool:
+    """True if obj comes back from a JSON round trip with the same types (str keys, no tuples/dates/NaN)."""
+    if isinstance(obj, dict):
+        return all(isinstance(k, str) and _json_safe(v) for k, v in obj.items())
+    if isinstance(obj, list):
+        return all(_json_safe(v) for v in obj)
+    if isinstance(obj, float):
+        return math.isfinite(obj)
+    return obj is None or isinstance(obj, (str, int, bool))
+
+
+def _read_yaml_sidecar(path, signature: tuple):
+    """Returns the sidecar's data if it was written for this exact YAML mtime and size, else None."""
+    try:
+        with open_buffered(f'{path}.json', 'rb') as f:
+            sidecar = json_loads(f.read())
+    except (OSError, ValueError):
+        return None
+    if (not isinstance(sidecar, dict) or sidecar.get('mtime_ns') != signature[0]
+            or sidecar.get('size') != signature[1]):
+        return None
+    return sidecar.get('data')
+
+
+def _write_yaml_sidecar(path, signature: tuple, data):
+    """
+    Stores a parsed YAML document as JSON next to its source; failures are ignored.
+
+    Documents that JSON cannot reproduce exactly (e.g. int keys in a watchlist)
+    get no sidecar, and any older one is removed, so a restart never reads
+    back different types than a fresh YAML parse would.
+    """
+    sidecar_path = f'{path}.json'
+    try:
+        if not _json_safe(data):
+            if os.path.exists(sidecar_path):
+                os.remove(sidecar_path)
+            return
+        atomic_write(sidecar_path, json_dumps({'mtime_ns': signature[0], 'size': signature[1], 'data': data}))
+    except (OSError, TypeError):
+        pass
@@ -0,0 +1,66 @@
+"""
+Shared logger for the notification server and user modules.
+
+Callers only enqueue records through a QueueHandler; a single QueueListener
+thread formats them and writes to stdout, so busy worker threads never
+contend on the stream lock.
+"""
+
+import sys
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+
+LOGGER_NAME = 'buff_auto'
+LOG_FORMAT = '%(asctime)s %(levelname)s %(threadName)s: %(message)s'
+
+_log_queue = queue.Queue(-1)
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def get_logger(name: str = None) -> logging.Logger:
+    """
+    Returns the package logger (or a child of it), starting the writer thread on first use.
+
+    Args:
+        name (str, optional): Child logger suffix, e.g. 'server' for 'buff_auto.server'.
+
+    Returns:
+        logging.Logger: A logger whose records are written asynchronously.
+    """
+    _ensure_listener()
+    return logging.getLogger(f'{LOGGER_NAME}.{name}' if name else LOGGER_NAME)
+
+
+def set_level(level):
+    """
+    Sets the package log level.
+
+    Args:
+        level: A level name such as 'DEBUG' or 'INFO', or a logging level number.
+    """
+    if isinstance(level, str):
+        level = level.upper()
+    logging.getLogger(LOGGER_NAME).setLevel(level)
+
+
+def _ensure_listener():
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            return
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        _listener = logging.handlers.QueueListener(_log_queue, stream_handler)
+        _listener.start()
+        # Flush anything still queued when the interpreter exits
+        atexit.register(_listener.stop)
+
+        root = logging.getLogger(LOGGER_NAME)
+        root.addHandler(logging.handlers.QueueHandler(_log_queue))
+        root.setLevel(logging.INFO)
+        # Records are written by the listener only; don't repeat them through the root logger
+        root.propagate = False
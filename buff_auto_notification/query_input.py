@@ -2,11 +2,12 @@
 # -*- coding: utf-8 -*-
 
 import os
-import yaml
 import json
 import uuid
 from typing import Dict, Any, List, Optional
 
+from fileio import load_yaml, dump_yaml, path_lock
+
 class QueryInput:
     """
     用于接收用户输入的查询条件并将其存储到用户配置的 watchlist 中
@@ -50,23 +51,22 @@ class QueryInput:
             return False
         
         try:
-            # 读取用户配置
-            with open(user_config_path, 'r', encoding='utf-8') as f:
-                user_config = yaml.safe_load(f)
-            
-            # 确保 watchlist 存在
-            if 'watchlist' not in user_config:
-                user_config['watchlist'] = {}
-            
-            # 生成唯一的查询 ID
-            query_id = str(uuid.uuid4())[:8]
-            
-            # 添加查询到 watchlist
-            user_config['watchlist'][query_id] = query_data
-            
-            # 保存更新后的配置
-            with open(user_config_path, 'w', encoding='utf-8') as f:
-                yaml.dump(user_config, f, default_flow_style=False, allow_unicode=True)
+            with path_lock(user_config_path):
+                # 读取用户配置
+                user_config = load_yaml(user_config_path)
+                
+                # 确保 watchlist 存在
+                if 'watchlist' not in user_config:
+                    user_config['watchlist'] = {}
+                
+                # 生成唯一的查询 ID
+                query_id = str(uuid.uuid4())[:8]
+                
+                # 添加查询到 watchlist
+                user_config['watchlist'][query_id] = query_data
+                
+                # 保存更新后的配置（原子替换）
+                dump_yaml(user_config_path, user_config, fsync=True, default_flow_style=False, allow_unicode=True)
             
             return True
         except Exception as e:
@@ -95,7 +95,82 @@ class QueryInput:
         Returns:
             tuple: (成功状态, 消息)
         """
-        # 构建查询条件数据
+        return self.api_add_queries(
+            username=username,
+            email=email,
+            buff_cookies=buff_cookies,
+            queries=[{
+                'goods_id': goods_id,
+                'game': game,
+                'price_min': price_min,
+                'price_max': price_max,
+                'sort_by': sort_by,
+                'item_name': item_name
+            }]
+        )
+
+    def api_add_queries(self, username: str, email: str, buff_cookies: str,
+                        queries: List[Dict[str, Any]]) -> tuple:
+        """
+        API 接口：批量添加查询条件到用户的 watchlist，只读写一次配置文件
+        
+        Args:
+            username: 用户名
+            email: 通知邮箱
+            buff_cookies: Buff 网站的 cookies
+            queries: 查询列表，每项包含 goods_id、game，以及可选的
+                price_min、price_max、sort_by、item_name
+            
+        Returns:
+            tuple: (成功状态, 消息)
+        """
+        # 更新用户的 cookies 和 email
+        user_config_path = os.path.join(self.config_dir, username, 'user_data.yaml')
+        try:
+            with path_lock(user_config_path):
+                user_config = load_yaml(user_config_path)
+            
+                # 更新 cookies 和 email
+                user_config['buff_cookies'] = buff_cookies
+            
+                if 'notification_settings' not in user_config:
+                    user_config['notification_settings'] = {}
+            
+                user_config['notification_settings']['email'] = email
+            
+                # 确保 watchlist 存在
+                if 'watchlist' not in user_config:
+                    user_config['watchlist'] = {}
+            
+                for query in queries:
+                    goods_id = query['goods_id']
+                    # 直接使用商品ID作为键
+                    user_config['watchlist'][goods_id] = {
+                        'conditions': self._build_conditions(query.get('price_min'), query.get('price_max')),
+                        'game': query['game'],
+                        'goods_id': goods_id,
+                        'item_name': query.get('item_name') or f"商品 {goods_id}"
+                    }
+            
+                # 保存更新后的配置（原子替换）
+                dump_yaml(user_config_path, user_config, fsync=True, default_flow_style=False, allow_unicode=True)
+
+            return True, "成功添加查询条件"
+        except Exception as e:
+            return False, f"更新用户配置时出错: {e}"
+
+    def _build_conditions(self, price_min: Optional[float] = None,
+                          price_max: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        根据价格范围构建查询条件数据
+        
+        Args:
+            price_min: 最低价格
+            price_max: 最高价格
+            
+        Returns:
+            List[Dict[str, Any]]: 条件列表
+        """
         conditions = []
         
         # 添加价格条件
@@ -115,39 +190,7 @@ class QueryInput:
                 'value': float(price_max)
             })
         
-        # 更新用户的 cookies 和 email
-        user_config_path = os.path.join(self.config_dir, username, 'user_data.yaml')
-        try:
-            with open(user_config_path, 'r', encoding='utf-8') as f:
-                user_config = yaml.safe_load(f)
-            
-            # 更新 cookies 和 email
-            user_config['buff_cookies'] = buff_cookies
-            
-            if 'notification_settings' not in user_config:
-                user_config['notification_settings'] = {}
-            
-            user_config['notification_settings']['email'] = email
-            
-            # 确保 watchlist 存在
-            if 'watchlist' not in user_config:
-                user_config['watchlist'] = {}
-            
-            # 直接使用商品ID作为键
-            user_config['watchlist'][goods_id] = {
-                'conditions': conditions,
-                'game': game,
-                'goods_id': goods_id,
-                'item_name': item_name or f"商品 {goods_id}"
-            }
-            
-            # 保存更新后的配置
-            with open(user_config_path, 'w', encoding='utf-8') as f:
-                yaml.dump(user_config, f, default_flow_style=False, allow_unicode=True)
-                
-            return True, "成功添加查询条件"
-        except Exception as e:
-            return False, f"更新用户配置时出错: {e}"
+        return conditions
     
     def cli_interface(self):
         """
@@ -1,9 +1,92 @@
 import os
+import sys
 import yaml
 import hashlib
+import hmac
 import re
 from typing import Dict, Any, Tuple, Optional
 
+# 兼容从项目根目录以包形式导入（frontend/app.py）
+try:
+    from fileio import load_yaml, atomic_write
+except ImportError:
+    sys.path.append(os.path.dirname(__file__))
+    from fileio import load_yaml, atomic_write
+
+# 密码哈希的 pepper 从环境变量读取（blake2b 的 key 最长 64 字节）
+PASSWORD_PEPPER = os.environ.get('BUFF_PASSWORD_PEPPER', '').encode('utf-8')[:64]
+# 轮换 pepper 时，把旧值以逗号分隔放入该变量，旧哈希仍可校验并在登录时升级
+PREVIOUS_PASSWORD_PEPPERS = [
+    p.encode('utf-8')[:64] for p in os.environ.get('BUFF_PASSWORD_PEPPER_PREVIOUS', '').split(',') if p
+]
+# 新格式哈希的前缀；没有前缀的是旧版 sha256 哈希
+HASH_SCHEME_PREFIX = 'blake2b$'
+
+
+def _pepper_id(pepper: bytes) -> str:
+    """pepper 的短标识（不泄露 pepper 本身），未设置 pepper 时为 '0'"""
+    return hashlib.blake2b(pepper, digest_size=4).hexdigest() if pepper else '0'
+
+
+# 可用于校验的 pepper：{pepper_id: pepper}；空 pepper 始终保留，兼容未设置时写入的哈希
+_KNOWN_PEPPERS = {_pepper_id(p): p for p in [b'', *PREVIOUS_PASSWORD_PEPPERS, PASSWORD_PEPPER]}
+# 当前 pepper 写出的哈希前缀：blake2b$<pepper_id>$
+CURRENT_HASH_PREFIX = f'{HASH_SCHEME_PREFIX}{_pepper_id(PASSWORD_PEPPER)}$'
+
+# 邮箱格式，模块加载时编译一次
+EMAIL_RE = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+
+
+def hash_password(password: str) -> str:
+    """
+    使用带 pepper 的 blake2b 对密码进行哈希处理
+
+    Args:
+        password: 原始密码
+
+    Returns:
+        str: 带方案前缀和 pepper 标识的密码哈希值
+    """
+    return CURRENT_HASH_PREFIX + _blake2b_digest(password, PASSWORD_PEPPER)
+
+
+def _blake2b_digest(password: str, pepper: bytes) -> str:
+    return hashlib.blake2b(password.encode('utf-8'), digest_size=32, key=pepper).hexdigest()
+
+
+def verify_password(password: str, stored_hash: Optional[str]) -> bool:
+    """
+    校验密码，兼容旧版 sha256 哈希及旧 pepper 写出的哈希
+
+    Args:
+        password: 原始密码
+        stored_hash: 用户数据中保存的哈希值
+
+    Returns:
+        bool: 密码是否正确；哈希使用的 pepper 未配置时返回 False
+    """
+    if not stored_hash:
+        return False
+    if not stored_hash.startswith(HASH_SCHEME_PREFIX):
+        candidate = hashlib.sha256(password.encode('utf-8')).hexdigest()
+        return hmac.compare_digest(candidate, stored_hash)
+    body = stored_hash[len(HASH_SCHEME_PREFIX):]
+    if '$' in body:
+        pepper_id, digest = body.split('$', 1)
+        pepper = _KNOWN_PEPPERS.get(pepper_id)
+        if pepper is None:
+            return False
+        return hmac.compare_digest(_blake2b_digest(password, pepper), digest)
+    # 早期 blake2b$<digest> 哈希未记录 pepper，逐个尝试已知 pepper
+    return any(hmac.compare_digest(_blake2b_digest(password, pepper), body)
+               for pepper in _KNOWN_PEPPERS.values())
+
+
+def needs_rehash(stored_hash: Optional[str]) -> bool:
+    """哈希不是由当前 pepper 写出时返回 True，调用方应在密码校验通过后重新哈希"""
+    return not (stored_hash or '').startswith(CURRENT_HASH_PREFIX)
+
+
 class UserRegistration:
     """
     处理用户注册和账户管理的类
@@ -62,8 +145,7 @@ class UserRegistration:
         
         # 保存用户数据
         try:
-            with open(config_path, 'w', encoding='utf-8') as f:
-                yaml.dump(user_data, f, sort_keys=False)
+            atomic_write(config_path, yaml.dump(user_data, sort_keys=False).encode('utf-8'))
             return True, "用户注册成功"
         except Exception as e:
             return False, f"注册失败: {str(e)}"
@@ -90,14 +172,12 @@ class UserRegistration:
         
         # 加载用户数据
         try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                user_data = yaml.safe_load(f)
+            user_data = load_yaml(config_path)
         except Exception as e:
             return False, f"读取用户数据失败: {str(e)}"
         
         # 验证密码
-        stored_hash = user_data.get('password_hash')
-        if not stored_hash or self._hash_password(password) != stored_hash:
+        if not verify_password(password, user_data.get('password_hash')):
             return False, "密码不正确"
         
         return True, "验证成功"
@@ -117,8 +197,7 @@ class UserRegistration:
             return None
         
         try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f)
+            return load_yaml(config_path)
         except Exception:
             return None
     
@@ -133,8 +212,7 @@ class UserRegistration:
             bool: 邮箱格式是否正确
         """
         # 邮箱格式验证
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return bool(re.match(pattern, email))
+        return bool(EMAIL_RE.fullmatch(email))
     
     def _hash_password(self, password: str) -> str:
         """
@@ -146,7 +224,7 @@ class UserRegistration:
         Returns:
             str: 密码哈希值
         """
-        return hashlib.sha256(password.encode('utf-8')).hexdigest()
+        return hash_password(password)
 
 
 # 为前端提供的 API 接口
@@ -1,39 +1,214 @@
 import os
-import yaml
 import time
+import asyncio
+import operator
+import heapq
+import base64
+import queue
+import signal
+import ssl
 import threading
 import smtplib
-from email.mime.text import MIMEText
 from email.header import Header
-from typing import Dict, Any, List
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from dataclasses import dataclass, field
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from cache import MarketCache
 from BuffApiPublic import BuffAccount
+from fileio import load_config, load_yaml
+from logutil import get_logger, set_level
+
+log = get_logger('server')
+
+# Outbound alerts waiting for the mail thread
+MAIL_QUEUE_SIZE = 1024
+# Alerts arriving within this window are coalesced into one send per distinct message
+MAIL_BATCH_WINDOW_SECONDS = 0.25
+MAIL_BATCH_MAX = 64
+# Raw MIME skeleton for alerts; equivalent to MIMEText(content, 'plain', 'utf-8') without per-message objects
+_MIME_TEMPLATE = (
+    "From: {sender}\n"
+    "To: {to}\n"
+    "Subject: {subject}\n"
+    "MIME-Version: 1.0\n"
+    "Content-Type: text/plain; charset=\"utf-8\"\n"
+    "Content-Transfer-Encoding: base64\n"
+    "\n"
+    "{body}"
+)
+# Upper bound on watchlist checks running at the same time
+MAX_CHECK_WORKERS = 32
+# Watchlist items of one user refreshed in parallel against the Buff API
+API_CONCURRENCY = 4
+# Upper bound for the adaptive per-user check interval, in minutes; the lower bound is the user's own frequency
+MAX_CHECK_INTERVAL_MINUTES = 240
+# Fields compared between snapshots to decide whether a watchlist is active
+_PRICE_FIELDS = ('sell_min_price', 'buy_max_price', 'quick_price')
 
 def evaluate_with_ai(prompt: str, data: Dict[str, Any]) -> bool:
     pass # Placeholder for AI evaluation logic
 
+_THRESHOLD_OPERATORS = {'<': operator.lt, '>': operator.gt}
+
+def _never(item_data: Dict[str, Any]) -> bool:
+    return False
+
+def _compile_condition(condition: Dict[str, Any]):
+    """
+    Specializes a watchlist condition into a predicate over cached item data.
+
+    Args:
+        condition (Dict[str, Any]): A condition from the user's watchlist.
+
+    Returns:
+        Callable[[Dict[str, Any]], bool]: Returns True when the condition fires.
+    """
+    condition_type = condition.get('condition_type')
+    if condition_type == 'price_threshold':
+        op = _THRESHOLD_OPERATORS.get(condition.get('operator'))
+        if op is None:
+            return _never
+        field = condition.get('target_field')
+        threshold = float(condition.get('value'))
+        return lambda d, op=op, field=field, threshold=threshold: op(float(d.get(field, 0)), threshold)
+
+    if condition_type == 'ai_evaluation':
+        prompt = condition.get('prompt')
+        return lambda d, prompt=prompt: evaluate_with_ai(prompt, {
+            "item_name": d.get('name'),
+            "current_price": float(d.get('sell_min_price', 0))
+        })
+
+    # 'price_change' and unknown types never fire
+    return _never
+
+def _index_by_key(items: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Indexes items by str(id) and market_hash_name, the two forms a watchlist key takes."""
+    index: Dict[str, Dict[str, Any]] = {}
+    for item in items or []:
+        if item.get('market_hash_name'):
+            index.setdefault(item['market_hash_name'], item)
+        if item.get('id') is not None:
+            index[str(item['id'])] = item
+    return index
+
+def _prices_changed(previous: Optional[Dict[str, Any]], current: Dict[str, Any]) -> bool:
+    """True if a refreshed item's prices differ from the previously cached entry (or there was none)."""
+    if not previous:
+        return True
+    return any(previous.get(f) != current.get(f) for f in _PRICE_FIELDS)
+
+def _watchlist_key(goods_id: Any):
+    """Keys can be numeric id or market_hash_name. Numeric ids are coerced to int."""
+    try:
+        return int(goods_id)
+    except Exception:
+        return goods_id
+
+@dataclass(slots=True)
+class ServerUser:
+    """A user as seen by the notification server; user_data and buff are loaded on first check."""
+    username: str
+    user_data_path: str
+    cache_manager: MarketCache
+    user_data: Optional[Dict[str, Any]] = None
+    buff: Any = None
+    # Adaptive check interval in minutes; starts at the configured frequency
+    current_interval: Optional[float] = None
+
+@dataclass(slots=True)
+class _PassResults:
+    """Buff API results shared by every item check within one user pass."""
+    # Freshly upserted items keyed like _index_by_key
+    fresh: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    # Futures of search_goods_list responses keyed by (search_key, game), including in-flight ones
+    searches: Dict[tuple, Future] = field(default_factory=dict)
+    # Guards searches so concurrent item checks claim each search key exactly once
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    # Set when a refreshed item's prices differ from what the cache held before the pass
+    changed: bool = False
+
+# Failures that mean the connection itself is gone. Every SMTPException is an
+# OSError, so catching OSError would also reconnect on refused recipients or data.
+_SMTP_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, ssl.SSLError)
+
+class _SMTPConnection:
+    """A shared SMTP connection that is health-checked before use and rebuilt once on failure."""
+
+    def __init__(self, connect, smtp=None):
+        # connect() returns a logged-in SMTP client, or None on failure
+        self._connect = connect
+        self._smtp = smtp
+        # All user threads share this connection
+        self._lock = threading.Lock()
+
+    def send(self, sender: str, recipients: List[str], msg: str):
+        with self._lock:
+            if self._smtp is not None:
+                try:
+                    self._smtp.noop()
+                except _SMTP_CONNECTION_ERRORS:
+                    self._smtp = None
+            try:
+                self._ensure_connected().sendmail(sender, recipients, msg)
+            except _SMTP_CONNECTION_ERRORS:
+                # The socket dropped between the health check and the send; reconnect once and retry
+                self._smtp = None
+                self._ensure_connected().sendmail(sender, recipients, msg)
+
+    def _ensure_connected(self):
+        if self._smtp is None:
+            self._smtp = self._connect()
+            if self._smtp is None:
+                raise smtplib.SMTPServerDisconnected("email server not running")
+        return self._smtp
+
+    def quit(self):
+        with self._lock:
+            if self._smtp is not None:
+                try:
+                    self._smtp.quit()
+                except Exception:
+                    pass
+                self._smtp = None
+
 class BuffAutoNotificationServer:
     """Manages all user accounts and handles automated notifications."""
 
     def __init__(self):
         self.SERVER_CONFIG: Dict[str, Any] = self._load_server_config()
+        set_level(self.SERVER_CONFIG.get('server_settings', {}).get('log_level', 'INFO'))
         # Prepare email server first so we can notify on startup issues
-        self.email_server = self._setup_email_server()
+        email_server = self._setup_email_server()
+        self._conn = None
+        if self.SERVER_CONFIG.get('email_settings'):
+            # Reconnects lazily if the initial connection failed or later drops
+            self._conn = _SMTPConnection(self._setup_email_server, email_server)
+            # The From header is identical on every alert, so it is encoded once
+            self._from_header = Header(self.SERVER_CONFIG['email_settings']['user'], 'utf-8').encode()
+        # A single mail thread drains alerts so user threads never block on SMTP
+        self._mail_q: queue.Queue = queue.Queue(maxsize=MAIL_QUEUE_SIZE)
+        self._mail_thread = threading.Thread(target=self._mail_loop, daemon=True)
+        self._mail_thread.start()
         # Shared cache manager for all users
         shared_cache_dir = self.SERVER_CONFIG.get('shared_cache_dir', 'shared_market_cache')
-        icon_delay = self.SERVER_CONFIG.get('server_settings', {}).get('icon_download_delay_seconds', 0)
-        self.cache_manager = MarketCache(cache_dir=shared_cache_dir)
-        # Attach delay to cache manager for icon throttling within single upsert calls
-        setattr(self.cache_manager, 'icon_download_delay_seconds', icon_delay)
+        icon_concurrency = self.SERVER_CONFIG.get('server_settings', {}).get('icon_download_concurrency', 8)
+        # Icon downloads within a single upsert call are bounded by this concurrency
+        self.cache_manager = MarketCache(cache_dir=shared_cache_dir, icon_concurrency=icon_concurrency)
         self.users: Dict[str, Any] = self._load_all_users()
         self.stop_event = threading.Event()
         self.threads: List[threading.Thread] = []
+        # Scheduler heap of (next_due_monotonic, username), guarded by the condition
+        self._schedule: List[tuple] = []
+        self._schedule_cv = threading.Condition()
+        # Blocking Buff API calls from every user's async pass run on this shared pool
+        self._api_pool = ThreadPoolExecutor(max_workers=MAX_CHECK_WORKERS)
 
     def _load_server_config(self) -> Dict[str, Any]:
         try:
-            with open('server_config.yaml', 'r') as f:
-                return yaml.safe_load(f)
+            return load_config('server_config.yaml')
         except FileNotFoundError:
             raise FileNotFoundError("server_config.yaml not found. Please create it.")
         except Exception as e:
@@ -43,58 +218,70 @@ class BuffAutoNotificationServer:
         users: Dict[str, Any] = {}
         user_dir_base = self.SERVER_CONFIG.get('user_data_base_dir', 'configs')
 
-        if not os.path.exists(user_dir_base):
-            print("User data directory not found. Exiting.")
+        try:
+            with os.scandir(user_dir_base) as it:
+                # DirEntry.is_dir() uses the type from the directory listing, saving a stat per user
+                user_entries = [(entry.name, entry.path) for entry in it if entry.is_dir(follow_symlinks=False)]
+        except FileNotFoundError:
+            log.warning("User data directory not found. Exiting.")
             return users
 
-        for username in os.listdir(user_dir_base):
-            print(f"Loading user: {username}")
-            user_path = os.path.join(user_dir_base, username)
-            if not os.path.isdir(user_path):
-                continue
-            data_path = os.path.join(user_path, 'user_data.yaml')
-            try:
-                with open(data_path, 'r', encoding='utf-8') as f:
-                    user_data = yaml.safe_load(f) or {}
-            except Exception as e:
-                print(f"Failed to read user_data.yaml for '{username}': {e}. Skipping.")
-                continue
-
-            cookies = (user_data or {}).get('buff_cookies', '')
-            buff_client = None
-            try:
-                buff_client = BuffAccount(buffcookie=cookies)
-                users[username] = type('ServerUser', (), {
-                    'username': username,
-                    'user_data': user_data,
-                    'buff': buff_client,
-                    'cache_manager': self.cache_manager,
-                })()
-            except Exception as e:
-                # Notify user via email if configured; otherwise print for debug
-                to_email = (user_data or {}).get('notification_settings', {}).get('email')
-                subject = f"Buff Notification: Cookie invalid for user {username}"
-                content = (
-                    f"Your Buff cookies appear to be invalid.\n"
-                    f"Server could not initialize BuffAccount for '{username}'.\n"
-                    f"Error: {e}\n\n"
-                    f"Please update your cookies in your user settings."
-                )
-                try :
-                    self._send_email(to_email, subject, content, debug_mode=not bool(to_email))
-                except Exception as email_e:
-                    print(f"Failed to send cookie invalid email to '{username}': {email_e}")
-                # Abort server startup since a user's cookies are invalid
-                print(f"Failed to initialize BuffAccount for '{username}': {e}")
-        
+        for username, user_path in user_entries:
+            # Only the path is recorded here; parsing and login wait for the user's first check
+            users[username] = ServerUser(
+                username=username,
+                user_data_path=os.path.join(user_path, 'user_data.yaml'),
+                cache_manager=self.cache_manager,
+            )
+
         if users:
-            print(f"Loaded {len(users)} user(s).")
+            log.info(f"Found {len(users)} user(s).")
             return users
 
+    def _load_user(self, user_instance: ServerUser) -> bool:
+        """
+        Parses a user's data and logs in to Buff the first time the user is checked.
+
+        Returns:
+            bool: False if the user cannot be loaded and should no longer be scheduled.
+        """
+        if user_instance.user_data is not None:
+            return True
+        username = user_instance.username
+        log.info(f"Loading user: {username}")
+        try:
+            user_data = load_yaml(user_instance.user_data_path) or {}
+        except Exception as e:
+            log.error(f"Failed to read user_data.yaml for '{username}': {e}. Skipping.")
+            return False
+
+        cookies = user_data.get('buff_cookies', '')
+        try:
+            user_instance.buff = BuffAccount(buffcookie=cookies)
+        except Exception as e:
+            # Notify user via email if configured; otherwise print for debug
+            to_email = user_data.get('notification_settings', {}).get('email')
+            subject = f"Buff Notification: Cookie invalid for user {username}"
+            content = (
+                f"Your Buff cookies appear to be invalid.\n"
+                f"Server could not initialize BuffAccount for '{username}'.\n"
+                f"Error: {e}\n\n"
+                f"Please update your cookies in your user settings."
+            )
+            try :
+                self._send_email(to_email, subject, content, debug_mode=not bool(to_email))
+            except Exception as email_e:
+                log.error(f"Failed to send cookie invalid email to '{username}': {email_e}")
+            log.error(f"Failed to initialize BuffAccount for '{username}': {e}")
+            return False
+        user_instance.user_data = user_data
+        log.info(f"Loaded user {username}. Frequency: {self._check_frequency(user_instance)} mins.")
+        return True
+
     def _setup_email_server(self):
         email_config = self.SERVER_CONFIG.get('email_settings', {})
         if not email_config:
-            print("Email settings not configured.")
+            log.warning("Email settings not configured.")
             return None
         
         try:
@@ -104,185 +291,318 @@ class BuffAutoNotificationServer:
             server.login(email_config['user'], auth_code)
             return server
         except Exception as e:
-            print(f"Failed to set up email server: {e}")
+            log.error(f"Failed to set up email server: {e}")
             return None
 
     def _send_email(self, to_email: str, subject: str, content: str, debug_mode: bool):
         if not to_email or debug_mode:
-            print(f"--- Email Debug Log ---")
-            print(f"Subject: {subject}")
-            print(f"To: {to_email or 'N/A'}")
-            print(f"Content:\n{content}")
-            print(f"-----------------------")
+            log.info("--- Email Debug Log ---\nSubject: %s\nTo: %s\nContent:\n%s\n-----------------------",
+                     subject, to_email or 'N/A', content)
             return
             
-        if not self.email_server:
-            print(f"Could not send email to {to_email}: email server not running.")
+        try:
+            self._mail_q.put_nowait((to_email, subject, content))
+        except queue.Full:
+            log.warning(f"Mail queue full; dropping email to {to_email}: {subject}")
+
+    def _mail_loop(self):
+        while True:
+            item = self._mail_q.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + MAIL_BATCH_WINDOW_SECONDS
+            stopping = False
+            while len(batch) < MAIL_BATCH_MAX:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._mail_q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            # Identical alerts to different users go out as one message with several recipients
+            groups: Dict[tuple, List[str]] = {}
+            for to_email, subject, content in batch:
+                recipients = groups.setdefault((subject, content), [])
+                if to_email not in recipients:
+                    recipients.append(to_email)
+            for (subject, content), recipients in groups.items():
+                self._deliver_email(recipients, subject, content)
+            if stopping:
+                return
+
+    def _deliver_email(self, recipients: List[str], subject: str, content: str):
+        to_label = ', '.join(recipients)
+        if not self._conn:
+            log.error(f"Could not send email to {to_label}: email server not running.")
             return
 
         sender = self.SERVER_CONFIG['email_settings']['user']
-        message = MIMEText(content, 'plain', 'utf-8')
-        message['From'] = Header(sender, 'utf-8')
-        message['To'] = Header(to_email, 'utf-8')
-        message['Subject'] = Header(subject, 'utf-8')
+        message = _MIME_TEMPLATE.format(
+            sender=self._from_header,
+            # Keep recipients of a shared message hidden from each other behind the
+            # RFC 5322 empty group, which must stay literal rather than an encoded word
+            to=Header(recipients[0], 'utf-8').encode() if len(recipients) == 1 else 'undisclosed-recipients:;',
+            subject=Header(subject, 'utf-8').encode(),
+            body=base64.encodebytes(content.encode('utf-8')).decode('ascii'),
+        )
 
         try:
-            self.email_server.sendmail(sender, [to_email], message.as_string())
-            print(f"Email sent to {to_email}.")
+            self._conn.send(sender, recipients, message)
+            log.info(f"Email sent to {to_label}.")
         except Exception as e:
-            print(f"Failed to send email to {to_email}: {e}")
+            log.error(f"Failed to send email to {to_label}: {e}")
+
+    def _close_mail(self):
+        """Flushes queued alerts, then closes the SMTP connection."""
+        if self._mail_thread.is_alive():
+            try:
+                self._mail_q.put(None, timeout=5)
+            except queue.Full:
+                pass
+            self._mail_thread.join(timeout=5)
+        if self._conn:
+            self._conn.quit()
+
+    def _check_frequency(self, user_instance: Any) -> float:
+        """Returns the user's current check interval in minutes."""
+        if user_instance.current_interval is not None:
+            return user_instance.current_interval
+        return self._configured_frequency(user_instance)
+
+    def _configured_frequency(self, user_instance: Any) -> float:
+        """Returns the check interval in minutes that the user asked for."""
+        return (user_instance.user_data or {}).get('notification_settings', {}).get('check_frequency_minutes', 30)
 
-    def _check_user_watchlist(self, user_instance: Any):
-        frequency = user_instance.user_data.get('notification_settings', {}).get('check_frequency_minutes', 30)
+    def _adapt_interval(self, user_instance: Any, changed: bool):
+        """
+        Adjusts a user's check interval after a pass: halved after a price change, doubled otherwise.
+
+        Watchlists whose prices stay put back off toward the maximum; the
+        interval never drops below the user's configured frequency.
+        """
+        server_settings = self.SERVER_CONFIG.get('server_settings', {})
+        min_interval = self._configured_frequency(user_instance)
+        max_interval = max(min_interval, server_settings.get('max_check_frequency_minutes', MAX_CHECK_INTERVAL_MINUTES))
+        current = self._check_frequency(user_instance)
+        if changed:
+            user_instance.current_interval = max(min_interval, current / 2)
+        else:
+            user_instance.current_interval = min(max_interval, current * 2)
+
+    def _check_user_once(self, user_instance: Any) -> bool:
+        """
+        Runs a single pass over a user's watchlist; the scheduler handles repetition.
+
+        Returns:
+            bool: False if the user could not be loaded and should be dropped from the schedule.
+        """
+        if not self._load_user(user_instance):
+            return False
+        watchlist = user_instance.user_data.get('watchlist', {})
+        if not watchlist:
+            log.info(f"User {user_instance.username} has no items in watchlist. Waiting...")
+            self._adapt_interval(user_instance, changed=False)
+            return True
+        # One cache query for the whole watchlist instead of one per item
+        keys = [_watchlist_key(goods_id) for goods_id in watchlist]
+        cached_by_key = _index_by_key(user_instance.cache_manager.load_cache(keys=keys))
+        results = _PassResults()
+        asyncio.run(self._check_user_async(user_instance, watchlist, cached_by_key, results))
+        self._adapt_interval(user_instance, results.changed)
+        return True
+
+    async def _check_user_async(self, user_instance: Any, watchlist: Dict[str, Any],
+                                cached_by_key: Dict[str, Dict[str, Any]], results: _PassResults):
+        """Checks watchlist items concurrently while keeping the Buff API request rate bounded."""
+        # Entries cached before this Unix time are stale; computed once for the whole pass.
+        # Staleness follows the configured frequency so backoff never delays a due refresh further.
+        cutoff_ts = time.time() - self._configured_frequency(user_instance) * 60
+        server_settings = self.SERVER_CONFIG.get('server_settings', {})
         # Delay between refreshing each wishlist item (seconds)
-        api_call_delay = (
-            self.SERVER_CONFIG.get('server_settings', {}).get('api_call_delay_seconds', 3)
-        )
-        print(f"Starting check thread for user {user_instance.username}. Frequency: {frequency} mins.")
+        api_call_delay = server_settings.get('api_call_delay_seconds', 3)
+        # Each slot is held for at least api_call_delay, so at most
+        # api_concurrency requests start per api_call_delay seconds
+        sem = asyncio.Semaphore(max(1, int(server_settings.get('api_concurrency', API_CONCURRENCY))))
+        loop = asyncio.get_running_loop()
 
-        while not self.stop_event.is_set():
-            watchlist = user_instance.user_data.get('watchlist', {})
-            if not watchlist:
-                print(f"User {user_instance.username} has no items in watchlist. Waiting...")
-            else:
-                for goods_id, metac_data in watchlist.items():
-                    # Keys can be numeric id or market_hash_name. Try to coerce numeric ids.
-                    key = None
-                    try:
-                        key = int(goods_id)
-                    except Exception:
-                        key = goods_id
-
-                    cached_items = user_instance.cache_manager.load_cache(keys=[key])
-                    
-                    # Determine whether cache is stale
-                    is_stale = True
-                    if cached_items:
-                        try:
-                            from datetime import datetime
-                            cached_ts = cached_items[0].get('cached_at')
-                            if cached_ts:
-                                cached_dt = datetime.fromisoformat(cached_ts)
-                                from datetime import timedelta
-                                is_stale = (datetime.now() - cached_dt) > timedelta(minutes=frequency)
-                        except Exception:
-                            is_stale = True
-
-                    if (not cached_items) or is_stale:
-                        print(f"Refreshing cache for item {goods_id}...")
-                        if not getattr(user_instance, 'buff', None):
-                            print(f"User {user_instance.username} has no valid Buff client; skipping refresh for {goods_id}.")
-                            time.sleep(api_call_delay)
-                            continue
-                        # Determine game to search, prefer cached item's game if available
-                        preferred_game = 'dota2'
-                        if cached_items and cached_items[0].get('game'):
-                            preferred_game = cached_items[0].get('game')
-
-                        api_response = None
-                        # Steps 1-3: market_hash_name -> short_name -> name
-                        mh_name = short_name = human_name = None
-                        if cached_items:
-                            mh_name = cached_items[0].get('market_hash_name')
-                            short_name = cached_items[0].get('short_name')
-                            human_name = cached_items[0].get('name')
-
-                        for search_key in [mh_name, short_name, human_name]:
-                            if not search_key:
-                                continue
-                            api_response = user_instance.buff.search_goods_list(key=search_key, game_name=preferred_game)
-                            if api_response:
-                                break
-
-                        # Step 4: use get_goods_info(goods_id) to resolve names, then retry 1-2
-                        if (not api_response) and isinstance(key, int):
-                            try:
-                                info = user_instance.buff.get_goods_info(goods_id=str(goods_id), game_name=preferred_game)
-                                resolved_mh = resolved_short = resolved_name = None
-                                if info:
-                                    goods_infos = info.get('goods_infos') or {}
-                                    gi = goods_infos.get(str(goods_id)) if isinstance(goods_infos, dict) else None
-                                    if gi:
-                                        resolved_mh = gi.get('market_hash_name')
-                                        resolved_name = gi.get('name')
-                                    if not resolved_name and info.get('items'):
-                                        first_item = info['items'][0]
-                                        resolved_mh = resolved_mh or first_item.get('market_hash_name')
-                                        resolved_short = first_item.get('short_name')
-                                        resolved_name = resolved_name or first_item.get('name')
-                                for search_key in [resolved_mh, resolved_short, resolved_name]:
-                                    if not search_key:
-                                        continue
-                                    api_response = user_instance.buff.search_goods_list(key=search_key, game_name=preferred_game)
-                                    if api_response:
-                                        break
-                            except Exception as e:
-                                print(f"get_goods_info lookup failed for {goods_id}: {e}")
-
-                        if api_response:
-                            items = api_response.get('items', []) if isinstance(api_response, dict) else api_response
-                            user_instance.cache_manager.upsert_cache(items)
-                            cached_items = user_instance.cache_manager.load_cache(keys=[key])
-                        else:
-                            print(f"Failed to refresh cache for {goods_id}: unable to resolve a valid search key")
-                            to_email = user_instance.user_data.get('notification_settings', {}).get('email')
-                            subject = f"Buff Notification: Failed to refresh {goods_id}"
-                            content = (
-                                f"Could not resolve market_hash_name/short_name/name for goods_id={goods_id}.\n"
-                                f"Please verify the watchlist entry and try again later."
-                            )
-                            self._send_email(to_email, subject, content, debug_mode=not bool(to_email))
-                            continue
-                    
-                    if not cached_items: 
+        async def check(goods_id, metac_data):
+            async with sem:
+                if self.stop_event.is_set():
+                    return
+                started = loop.time()
+                used_api = True
+                try:
+                    used_api = await loop.run_in_executor(
+                        self._api_pool, self._check_item, user_instance, goods_id, metac_data, cutoff_ts,
+                        cached_by_key.get(str(_watchlist_key(goods_id))), results
+                    )
+                except Exception as e:
+                    log.error(f"Check failed for item {goods_id}: {e}")
+                if used_api:
+                    await asyncio.sleep(max(0.0, api_call_delay - (loop.time() - started)))
+
+        await asyncio.gather(*[check(goods_id, metac_data) for goods_id, metac_data in watchlist.items()])
+
+    def _check_item(self, user_instance: Any, goods_id: Any, metac_data: Dict[str, Any], cutoff_ts: float,
+                    cached_item: Dict[str, Any] = None, results: _PassResults = None) -> bool:
+        """
+        Refreshes one watchlist item if its cache is stale and sends any triggered alerts.
+
+        Returns:
+            bool: True if the Buff API was called, so the caller should pace the next request.
+        """
+        key = _watchlist_key(goods_id)
+        cached_items = [cached_item] if cached_item else []
+        if results is None:
+            results = _PassResults()
+        used_api = False
+
+        # Determine whether cache is stale
+        is_stale = bool(cached_items) and (cached_items[0].get('cached_at_ts') or 0) < cutoff_ts
+
+        # An earlier search in this pass may already have returned this item
+        shared = results.fresh.get(str(key))
+        if shared and ((not cached_items) or is_stale):
+            cached_items = [shared]
+        elif (not cached_items) or is_stale:
+            log.info("Refreshing cache for item %s...", goods_id)
+            if not getattr(user_instance, 'buff', None):
+                log.warning(f"User {user_instance.username} has no valid Buff client; skipping refresh for {goods_id}.")
+                return used_api
+            # Determine game to search, prefer cached item's game if available
+            preferred_game = 'dota2'
+            if cached_items and cached_items[0].get('game'):
+                preferred_game = cached_items[0].get('game')
+
+            api_response = None
+            used_api = True
+            tried = set()
+            # A cached market_hash_name is searched directly, so a routine refresh costs one request
+            cached_mh = cached_items[0].get('market_hash_name') if cached_items else None
+            if cached_mh:
+                tried.add(cached_mh)
+                api_response = self._search(user_instance, results, cached_mh, preferred_game)
+
+            # Numeric ids whose cached name is missing or no longer finds them resolve
+            # their canonical market_hash_name with get_goods_info
+            if isinstance(key, int) and str(key) not in results.fresh:
+                resolved_mh = self._resolve_market_hash_name(user_instance, goods_id, preferred_game)
+                if resolved_mh and resolved_mh not in tried:
+                    tried.add(resolved_mh)
+                    api_response = self._search(user_instance, results, resolved_mh, preferred_game)
+
+            # Fallback: market_hash_name -> short_name -> name from the cached entry
+            if not api_response and cached_items:
+                for name_key in ('market_hash_name', 'short_name', 'name'):
+                    search_key = cached_items[0].get(name_key)
+                    if not search_key or search_key in tried:
                         continue
-                    cached_item = cached_items[0]
-                    print(f"cached_item for {goods_id}: {cached_item}")
-                    sell_min_price = cached_item.get("sell_min_price", "N/A")
-                    print(f"sell_min_price for {goods_id}: {sell_min_price}")
-                    
-                    conditions = metac_data.get('conditions', [])
-                    if conditions != []:
-                        for condition in conditions:
-                            if self._evaluate_condition(condition, cached_item):
-                                subject = f"🔔 Buff Notification: {cached_item['name']} Price Alert!"
-                                content = self._generate_email_content(condition, cached_item)
-                                
-                                to_email = user_instance.user_data['notification_settings'].get('email')
-                                self._send_email(to_email, subject, content, debug_mode=not to_email)
-                                break
-
-                    if self.stop_event.wait(api_call_delay):
-                        return
-
-            if self.stop_event.wait(frequency * 60):
-                break
+                    tried.add(search_key)
+                    api_response = self._search(user_instance, results, search_key, preferred_game)
+                    if api_response:
+                        break
+
+            if api_response:
+                # The fresh API item is what the cache now holds; no need to read it back
+                fresh = results.fresh.get(str(key))
+                if fresh:
+                    cached_items = [fresh]
+            else:
+                log.error(f"Failed to refresh cache for {goods_id}: unable to resolve a valid search key")
+                to_email = user_instance.user_data.get('notification_settings', {}).get('email')
+                subject = f"Buff Notification: Failed to refresh {goods_id}"
+                content = (
+                    f"Could not resolve market_hash_name/short_name/name for goods_id={goods_id}.\n"
+                    f"Please verify the watchlist entry and try again later."
+                )
+                self._send_email(to_email, subject, content, debug_mode=not bool(to_email))
+                return used_api
+
+        if not cached_items: 
+            return used_api
+        if cached_items[0] is not cached_item and _prices_changed(cached_item, cached_items[0]):
+            results.changed = True
+        cached_item = cached_items[0]
+        log.debug("cached_item for %s: %s", goods_id, cached_item)
+        sell_min_price = cached_item.get("sell_min_price", "N/A")
+        log.debug("sell_min_price for %s: %s", goods_id, sell_min_price)
+
+        conditions = metac_data.get('conditions', [])
+        if conditions != []:
+            for condition in conditions:
+                if self._evaluate_condition(condition, cached_item):
+                    subject = f"🔔 Buff Notification: {cached_item['name']} Price Alert!"
+                    content = self._generate_email_content(condition, cached_item)
+
+                    to_email = user_instance.user_data['notification_settings'].get('email')
+                    self._send_email(to_email, subject, content, debug_mode=not to_email)
+                    break
+        return used_api
+
+    def _search(self, user_instance: Any, results: _PassResults, search_key: str, game_name: str):
+        """
+        Runs search_goods_list at most once per (search_key, game) in a pass and upserts the results.
+
+        Concurrent checks asking for the same key wait on the request already in
+        flight instead of issuing their own. Every item a search returns is
+        recorded in results.fresh before waiters are released, so entries covered
+        by a finished response skip their own request.
+        """
+        memo_key = (search_key, game_name)
+        with results.lock:
+            future = results.searches.get(memo_key)
+            is_owner = future is None
+            if is_owner:
+                future = results.searches[memo_key] = Future()
+        if not is_owner:
+            return future.result()
+
+        try:
+            api_response = user_instance.buff.search_goods_list(key=search_key, game_name=game_name)
+            if api_response:
+                items = api_response.get('items', []) if isinstance(api_response, dict) else api_response
+                user_instance.cache_manager.upsert_cache(items)
+                now = datetime.now()
+                stamp = {'cached_at': now.isoformat(), 'cached_at_ts': now.timestamp()}
+                for index_key, item in _index_by_key(items).items():
+                    results.fresh[index_key] = {**item, **stamp}
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        future.set_result(api_response)
+        return api_response
+
+    def _resolve_market_hash_name(self, user_instance: Any, goods_id: Any, game_name: str) -> Optional[str]:
+        """Looks up a goods_id's market_hash_name with a single get_goods_info call."""
+        try:
+            info = user_instance.buff.get_goods_info(goods_id=str(goods_id), game_name=game_name)
+        except Exception as e:
+            log.error(f"get_goods_info lookup failed for {goods_id}: {e}")
+            return None
+        if not info:
+            return None
+        goods_infos = info.get('goods_infos') or {}
+        gi = goods_infos.get(str(goods_id)) if isinstance(goods_infos, dict) else None
+        if gi and gi.get('market_hash_name'):
+            return gi['market_hash_name']
+        if info.get('items'):
+            return info['items'][0].get('market_hash_name')
+        return None
 
     def _evaluate_condition(self, condition: Dict[str, Any], item_data: Dict[str, Any]) -> bool:
-        condition_type = condition.get('condition_type')
-        if condition_type == 'price_threshold':
-            target_field = condition.get('target_field')
-            operator = condition.get('operator')
-            value = condition.get('value')
-            current_value = float(item_data.get(target_field, 0))
-            if operator == '<' and current_value < value:
-                return True
-            if operator == '>' and current_value > value:
-                return True
-        
-        elif condition_type == 'price_change':
-            pass
+        # Compiled once per condition; the server's copy of user_data is never written back to YAML
+        fn = condition.get('_fn')
+        if fn is None:
+            fn = condition['_fn'] = _compile_condition(condition)
+        return fn(item_data)
 
-        elif condition_type == 'ai_evaluation':
-            prompt = condition.get('prompt')
-            ai_data = {
-                "item_name": item_data.get('name'),
-                "current_price": float(item_data.get('sell_min_price', 0))
-            }
-            return evaluate_with_ai(prompt, ai_data)
-        
-        return False
-        
     def _generate_email_content(self, condition: Dict[str, Any], item_data: Dict[str, Any]) -> str:
         subject_lines: List[str] = []
         condition_type = condition.get('condition_type')
@@ -302,36 +622,79 @@ class BuffAutoNotificationServer:
         return "\n".join(subject_lines)
 
     def start(self):
-        print("Starting Buff Auto Notification Server.")
-        for username, user_instance in self.users.items():
-            thread = threading.Thread(target=self._check_user_watchlist, args=(user_instance,))
+        log.info("Starting Buff Auto Notification Server.")
+        users = self.users or {}
+        if users:
+            now = time.monotonic()
+            with self._schedule_cv:
+                # Every user gets an immediate first pass
+                self._schedule = [(now, username) for username in users]
+                heapq.heapify(self._schedule)
+            for username in users:
+                log.info(f"Scheduled checks for user {username}.")
+            thread = threading.Thread(target=self._run_scheduler, args=(users,))
             thread.daemon = True
             thread.start()
             self.threads.append(thread)
 
-        print("All user threads started. Server is running.")
+        log.info("Scheduler started. Server is running.")
+        if threading.current_thread() is threading.main_thread():
+            # Signal handlers can only be installed from the main thread
+            signal.signal(signal.SIGTERM, lambda *_: self.stop_event.set())
         try:
-            while not self.stop_event.wait(3600):
-                pass
+            # Parks the thread until stop() or SIGTERM, with no periodic wakeups
+            self.stop_event.wait()
         except KeyboardInterrupt:
-            print("Server is shutting down.")
+            self.stop_event.set()
         finally:
-            if self.email_server:
-                try:
-                    self.email_server.quit()
-                except Exception:
-                    pass
+            log.info("Server is shutting down.")
+            with self._schedule_cv:
+                self._schedule_cv.notify_all()
+            self._close_mail()
+
+    def _run_scheduler(self, users: Dict[str, Any]):
+        """Pops due users off the heap and runs their checks on a bounded worker pool."""
+        with ThreadPoolExecutor(max_workers=min(MAX_CHECK_WORKERS, len(users))) as pool:
+            while not self.stop_event.is_set():
+                with self._schedule_cv:
+                    if not self._schedule:
+                        # Every user is mid-check; wait for one to be rescheduled
+                        self._schedule_cv.wait()
+                        continue
+                    due, username = self._schedule[0]
+                    delay = due - time.monotonic()
+                    if delay > 0:
+                        self._schedule_cv.wait(delay)
+                        continue
+                    heapq.heappop(self._schedule)
+                future = pool.submit(self._check_user_once, users[username])
+                future.add_done_callback(
+                    lambda f, username=username: self._reschedule(username, users[username], f)
+                )
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _reschedule(self, username: str, user_instance: Any, future):
+        exc = future.exception() if not future.cancelled() else None
+        if exc is not None:
+            log.error(f"Watchlist check failed for user {username}: {exc}")
+        elif not future.cancelled() and future.result() is False:
+            log.warning(f"User {username} removed from the schedule.")
+            return
+        if self.stop_event.is_set():
+            return
+        with self._schedule_cv:
+            heapq.heappush(self._schedule, (time.monotonic() + self._check_frequency(user_instance) * 60, username))
+            self._schedule_cv.notify()
 
     def stop(self):
         self.stop_event.set()
+        with self._schedule_cv:
+            self._schedule_cv.notify_all()
+        self._api_pool.shutdown(wait=False, cancel_futures=True)
         for t in self.threads:
             if t.is_alive():
                 try:
                     t.join(timeout=5)
                 except Exception:
                     pass
-        if self.email_server:
-            try:
-                self.email_server.quit()
-            except Exception:
-                pass
\ No newline at end of file
+        self._close_mail()
\ No newline at end of file
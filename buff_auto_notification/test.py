@@ -59,6 +59,8 @@ def test_user_configuration(user):
         
         user.edit_watchlist('add', '42583', watchlist_settings)
         print("✓ Watchlist item added")
+        # Write the batched edits before the server reads user_data.yaml
+        user.flush()
         
         return True
     except Exception as e:
@@ -1,10 +1,18 @@
 import os
-import yaml
-import hashlib
+import atexit
+import threading
 from typing import Dict, Any
 
 from BuffApiPublic import BuffAccount
 from cache import MarketCache
+from fileio import load_config, load_yaml, dump_yaml
+from logutil import get_logger
+from registration import hash_password, verify_password, needs_rehash
+
+log = get_logger('user')
+
+# Saves within this window are coalesced into a single rewrite of user_data.yaml
+USER_DATA_FLUSH_DELAY_SECONDS = 0.25
 
 class BuffAutoNotificationUser:
     """Manages a single user's Buff market notification system.
@@ -34,6 +42,9 @@ class BuffAutoNotificationUser:
         self._initialize_shared_cache()
         
         self.username = username
+        self._dirty = False
+        self._save_lock = threading.Lock()
+        self._flush_timer = None
         self.user_dir = os.path.join(self._SERVER_CONFIG['user_data_base_dir'], self.username)
         self.config_path = os.path.join(self.user_dir, 'user_data.yaml')
         
@@ -46,13 +57,11 @@ class BuffAutoNotificationUser:
         self.buff = None
 
     def _load_server_config(self):
-        """Loads server configuration from a YAML file if not already loaded."""
-        if not self._SERVER_CONFIG:
-            try:
-                with open('server_config.yaml', 'r') as f:
-                    self._SERVER_CONFIG = yaml.safe_load(f)
-            except FileNotFoundError:
-                raise FileNotFoundError("server_config.yaml not found. Please create it.")
+        """Loads server configuration from the process-wide memoized YAML config."""
+        try:
+            self._SERVER_CONFIG = load_config('server_config.yaml')
+        except FileNotFoundError:
+            raise FileNotFoundError("server_config.yaml not found. Please create it.")
     
     def _initialize_shared_cache(self):
         """Initializes the shared cache manager as a singleton if not already done."""
@@ -63,7 +72,7 @@ class BuffAutoNotificationUser:
     def _handle_registration(self, password: str):
         """Handles the registration process for a new user."""
         if os.path.exists(self.config_path):
-            print(f"User '{self.username}' already exists. Please log in instead.")
+            log.info(f"User '{self.username}' already exists. Please log in instead.")
             raise ValueError("User already exists.")
         
         os.makedirs(self.user_dir, exist_ok=True)
@@ -77,60 +86,111 @@ class BuffAutoNotificationUser:
             'watchlist': {}
         }
         self.user_data = default_data
-        self._save_user_data()
-        print(f"User '{self.username}' registered successfully.")
+        self._save_user_data(sync=True)
+        log.info(f"User '{self.username}' registered successfully.")
 
     def _handle_login(self, password: str):
         """Handles the login process for an existing user."""
         if not os.path.exists(self.config_path):
-            print(f"User '{self.username}' not found. Please register first.")
+            log.warning(f"User '{self.username}' not found. Please register first.")
             raise FileNotFoundError("User not found.")
         
         self.user_data = self._load_user_data()
         if not self._verify_password(password):
             raise ValueError("Incorrect password.")
-        print(f"User '{self.username}' logged in successfully.")
+        if needs_rehash(self.user_data['password_hash']):
+            # Upgrade a legacy or old-pepper hash now that the plaintext is known to be correct
+            self.user_data['password_hash'] = self._hash_password(password)
+            self._save_user_data(sync=True)
+        log.info(f"User '{self.username}' logged in successfully.")
 
     def _hash_password(self, password: str) -> str:
-        return hashlib.sha256(password.encode('utf-8')).hexdigest()
+        return hash_password(password)
 
     def _verify_password(self, password: str) -> bool:
-        """Verifies a password against the stored hash."""
-        stored_hash = self.user_data.get('password_hash')
-        return stored_hash and self._hash_password(password) == stored_hash
+        """Verifies a password against the stored hash in constant time."""
+        return verify_password(password, self.user_data.get('password_hash'))
 
     def _load_user_data(self) -> Dict[str, Any]:
         """Loads user data from the YAML file."""
-        with open(self.config_path, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+        return load_yaml(self.config_path)
 
-    def _save_user_data(self):
-        with open(self.config_path, 'w', encoding='utf-8') as f:
-            yaml.dump(self.user_data, f, sort_keys=False)
+    def _save_user_data(self, sync: bool = False):
+        """
+        Marks user data dirty and schedules a debounced write.
+
+        Args:
+            sync: Write immediately instead, for changes that must be durable on return.
+        """
+        if sync:
+            with self._save_lock:
+                self._dirty = True
+            self.flush()
+            return
+        with self._save_lock:
+            if not self._dirty:
+                # Unsaved edits are still written if the process exits before the timer fires
+                atexit.register(self.flush)
+            self._dirty = True
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+            self._flush_timer = threading.Timer(USER_DATA_FLUSH_DELAY_SECONDS, self._flush_in_background)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _flush_in_background(self):
+        """Timer callback; logs failures that would otherwise vanish with the timer thread."""
+        try:
+            self.flush()
+        except Exception:
+            log.exception(f"Failed to save user data for '{self.username}'.")
+
+    def flush(self):
+        """
+        Writes pending user data changes to user_data.yaml, if any.
+
+        Mutators change user_data only while holding _save_lock, so the dump
+        below never sees a half-applied edit.
+        """
+        with self._save_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._dirty:
+                return
+            dump_yaml(self.config_path, self.user_data, sort_keys=False)
+            self._dirty = False
+            atexit.unregister(self.flush)
 
     def change_password(self, old_password: str, new_password: str):
         if not self._verify_password(old_password):
             raise ValueError("Incorrect old password.")
-        self.user_data['password_hash'] = self._hash_password(new_password)
-        self._save_user_data()
-        print("Password successfully changed.")
+        password_hash = self._hash_password(new_password)
+        with self._save_lock:
+            self.user_data['password_hash'] = password_hash
+        self._save_user_data(sync=True)
+        log.info("Password successfully changed.")
 
     def reset_password(self, new_password: str):
         """Resets the user's password without old password verification."""
-        self.user_data['password_hash'] = self._hash_password(new_password)
-        self._save_user_data()
-        print("Password successfully reset.")
+        password_hash = self._hash_password(new_password)
+        with self._save_lock:
+            self.user_data['password_hash'] = password_hash
+        self._save_user_data(sync=True)
+        log.info("Password successfully reset.")
     
     def update_buff_cookies(self, cookies: str):
         """Updates the user's Buff account cookies."""
-        self.user_data['buff_cookies'] = cookies
+        with self._save_lock:
+            self.user_data['buff_cookies'] = cookies
         self._save_user_data()
         self.buff = None
-        print("Buff cookies updated.")
+        log.info("Buff cookies updated.")
 
     def edit_user_settings(self, settings: Dict[str, Any]):
         """Updates and saves user notification settings."""
-        self.user_data['notification_settings'].update(settings)
+        with self._save_lock:
+            self.user_data['notification_settings'].update(settings)
         self._save_user_data()
 
     def _ensure_buff_account(self):
@@ -167,9 +227,11 @@ class BuffAutoNotificationUser:
         if operation == 'add' or operation == 'update':
             if not settings:
                 raise ValueError("Settings must be provided for 'add' or 'update' operations.")
-            self.user_data['watchlist'][goods_id] = settings
+            with self._save_lock:
+                self.user_data['watchlist'][goods_id] = settings
         elif operation == 'remove':
-            self.user_data['watchlist'].pop(goods_id, None)
+            with self._save_lock:
+                self.user_data['watchlist'].pop(goods_id, None)
         self._save_user_data()
 
     def get_item_info(self, item_id: str) -> Dict[str, Any]:
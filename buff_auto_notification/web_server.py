@@ -1,19 +1,43 @@
 from flask import Flask, request, jsonify, render_template
+from flask.json.provider import JSONProvider
+from werkzeug.exceptions import BadRequest
 import yaml
 import os
 import hashlib
 import json
 import uuid
+import time
 import threading
+from functools import lru_cache
+from cachetools import TTLCache
 from registration import UserRegistration
 from query_input import QueryInput
 from server import BuffAutoNotificationServer
 from BuffApiPublic import BuffAccount
 from cache import MarketCache
+from fileio import Loader, load_yaml, dump_yaml, path_lock, json_dumps, json_loads
+from logutil import get_logger
+
+log = get_logger('web')
+
+class OrjsonProvider(JSONProvider):
+    """jsonify/request.json 使用 orjson（未安装时回退到标准库 json）"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return json_dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return json_loads(s)
+
+    def response(self, *args, **kwargs):
+        # 直接写入编码后的 bytes，省去 str 往返
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(json_dumps(obj), mimetype='application/json')
 
 app = Flask(__name__, 
             static_folder='../frontend/static',
             template_folder='../frontend/templates')
+app.json = OrjsonProvider(app)
 
 SHARED_CACHE_MANAGER = MarketCache(cache_dir="./shared_market_cache")
 
@@ -23,8 +47,9 @@ project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # 加载服务器配置
 SERVER_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server_config.yaml')
 try:
-    with open(SERVER_CONFIG_PATH, 'r') as f:
-        SERVER_CONFIG = yaml.safe_load(f)
+    # 按 bytes 一次读入再交给 C 解析器，省去文本解码
+    with open(SERVER_CONFIG_PATH, 'rb') as f:
+        SERVER_CONFIG = yaml.load(f.read(), Loader=Loader)
 except Exception as e:
     print(f"Error loading server config: {e}")
     SERVER_CONFIG = {"user_data_base_dir": "configs"}
@@ -32,11 +57,72 @@ except Exception as e:
 # 使用绝对路径确保用户数据存储在稳定位置
 USER_DATA_DIR = os.path.join(project_root, SERVER_CONFIG.get("user_data_base_dir", "configs"))
 
+# 用户配置文件路径，按用户名缓存以免每个请求重复 os.path.join
+@lru_cache(maxsize=4096)
+def _user_cfg_path(username: str) -> str:
+    return os.path.join(USER_DATA_DIR, username, 'user_data.yaml')
+
+# 用户名集合缓存：一次 scandir 代替每个请求的 os.path.exists
+_USER_SET_TTL = 2.0
+_user_set_cache = {"ts": float('-inf'), "names": frozenset()}
+_user_set_lock = threading.Lock()
+
+def user_exists(username: str) -> bool:
+    with _user_set_lock:
+        if time.monotonic() - _user_set_cache["ts"] > _USER_SET_TTL:
+            try:
+                with os.scandir(USER_DATA_DIR) as it:
+                    names = frozenset(entry.name for entry in it if entry.is_dir())
+            except FileNotFoundError:
+                names = frozenset()
+            _user_set_cache["names"] = names
+            _user_set_cache["ts"] = time.monotonic()
+        return username in _user_set_cache["names"]
+
+def _invalidate_user_set():
+    with _user_set_lock:
+        _user_set_cache["ts"] = float('-inf')
+
+# 注册/登录共用的 UserRegistration 实例（仅保存 config_dir，无需加锁）
+USER_REG = UserRegistration(config_dir=USER_DATA_DIR)
+
 # 存储查询服务器实例
 query_servers = {}
 
 # 近期搜索缓存（按用户名保存最近一次搜索结果用于名称->ID映射）
-recent_search_cache = {}
+# 有界 LRU + TTL，多线程访问时由锁保护
+recent_search_cache = TTLCache(maxsize=1024, ttl=300)
+_recent_search_lock = threading.RLock()
+
+def set_recent(username: str, payload: dict):
+    with _recent_search_lock:
+        recent_search_cache[username] = payload
+
+def get_recent(username: str):
+    with _recent_search_lock:
+        return recent_search_cache.get(username)
+
+# 固定错误信息的 JSON 只编码一次；每次请求仍新建 Response，避免跨线程共享可变对象
+@lru_cache(maxsize=64)
+def _error_body(message: str) -> bytes:
+    return json_dumps({"status": "error", "message": message})
+
+def error_response(message: str):
+    return app.response_class(_error_body(message), mimetype='application/json')
+
+# 解析 POST 请求体：直接用 orjson 解码原始 bytes，空请求体视为 {}
+def get_json() -> dict:
+    if not request.content_length:
+        return {}
+    try:
+        return json_loads(request.get_data(cache=False)) or {}
+    except ValueError:
+        raise BadRequest('请求体不是合法的 JSON')
+
+# 按 Cookie 复用 BuffAccount，避免每个请求重新登录并新建连接池
+@lru_cache(maxsize=256)
+def _buff_account(buff_cookies: str) -> BuffAccount:
+    return BuffAccount(buffcookie=buff_cookies)
 
 # 简化搜索返回的条目，便于前端展示
 def _simplify_item(item: dict) -> dict:
@@ -51,6 +137,20 @@ def _simplify_item(item: dict) -> dict:
         'quick_price': item.get('quick_price')
     }
 
+# 实时搜索名称并解析商品ID：精确匹配优先，否则取第一条结果
+# 搜索结果同时写入共享行情缓存，后续查询无需再次请求 Buff
+def _resolve_goods_id(buff: BuffAccount, name: str, game: str):
+    items = buff.search_goods_list(key=name, game_name=game) or []
+    if isinstance(items, dict):
+        items = items.get('items', [])
+    if not items:
+        return None
+    SHARED_CACHE_MANAGER.upsert_cache(items)
+    # reversed 保证同名条目以第一条为准
+    mapping = {(it.get('name') or it.get('market_hash_name') or it.get('short_name')): str(it['id'])
+               for it in reversed(items) if it.get('id') is not None}
+    return mapping.get(name) or next((str(it['id']) for it in items if it.get('id') is not None), None)
+
 # 启动查询服务器的函数
 def start_query_server(username):
     try:
@@ -70,12 +170,9 @@ def start_query_server(username):
         # server.user_name = username
         # server.user_data_path = user_data_path
                 
-        # 在新线程中启动服务器
-        def run_server():
-            server.start()  # 移除username参数，使用之前设置的用户配置
-        
-        server_thread = threading.Thread(target=run_server)
-        server_thread.daemon = True
+        # server.start() 会一直阻塞到 stop()，因此每个服务器使用独立的守护线程，
+        # 不放入有界线程池（否则进程退出时会等待这些线程，且超出上限的启动会被静默排队）
+        server_thread = threading.Thread(target=server.start, name=f'qsrv-{username}', daemon=True)
         server_thread.start()
         
         # 保存服务器实例
@@ -100,10 +197,7 @@ def stop_query_server(username):
             return True, "查询服务已停止"
         server.stop()
         if thread and thread.is_alive():
-            try:
-                thread.join(timeout=5)
-            except Exception:
-                pass
+            thread.join(timeout=5)
         info['status'] = 'stopped'
         return True, "查询服务已停止"
     except Exception as e:
@@ -119,16 +213,15 @@ def dashboard():
 
 @app.route('/api/start_query', methods=['POST'])
 def api_start_query():
-    data = request.json
+    data = get_json()
     username = data.get('username')
     
     if not username:
-        return jsonify({"status": "error", "message": "用户名不能为空"})
+        return error_response("用户名不能为空")
     
     # 检查用户目录是否存在
-    user_dir = os.path.join(USER_DATA_DIR, username)
-    if not os.path.exists(user_dir):
-        return jsonify({"status": "error", "message": "用户不存在"})
+    if not user_exists(username):
+        return error_response("用户不存在")
     
     # 检查是否已经有查询服务在运行
     if username in query_servers and query_servers[username]['status'] == 'running':
@@ -144,10 +237,10 @@ def api_start_query():
 
 @app.route('/api/stop_query', methods=['POST'])
 def api_stop_query():
-    data = request.json
+    data = get_json()
     username = data.get('username')
     if not username:
-        return jsonify({"status": "error", "message": "用户名不能为空"})
+        return error_response("用户名不能为空")
     success, message = stop_query_server(username)
     if success:
         return jsonify({"status": "success", "message": message})
@@ -156,34 +249,34 @@ def api_stop_query():
 
 @app.route('/api/register', methods=['POST'])
 def api_register():
-    data = request.json
+    data = get_json()
     email = data.get('email')
     password = data.get('password')
     
     if not email or not password:
-        return jsonify({"status": "error", "message": "邮箱和密码不能为空"})
+        return error_response("邮箱和密码不能为空")
     
     # 使用registration模块注册用户
-    user_reg = UserRegistration(config_dir=USER_DATA_DIR)
-    success, message = user_reg.register_user(email, password)
+    success, message = USER_REG.register_user(email, password)
     
     if success:
+        # 新用户目录需立即可见
+        _invalidate_user_set()
         return jsonify({"status": "success", "message": message})
     else:
         return jsonify({"status": "error", "message": message})
 
 @app.route('/api/login', methods=['POST'])
 def api_login():
-    data = request.json
+    data = get_json()
     email = data.get('email')
     password = data.get('password')
     
     if not email or not password:
-        return jsonify({"status": "error", "message": "邮箱和密码不能为空"})
+        return error_response("邮箱和密码不能为空")
     
     # 使用registration模块验证用户
-    user_reg = UserRegistration(config_dir=USER_DATA_DIR)
-    success, message = user_reg.verify_user(email, password)
+    success, message = USER_REG.verify_user(email, password)
     
     if success:
         return jsonify({"status": "success", "message": message})
@@ -195,16 +288,15 @@ def api_get_cookie():
     username = request.args.get('username')
     
     if not username:
-        return jsonify({"status": "error", "message": "缺少用户名参数"})
+        return error_response("缺少用户名参数")
     
-    user_config_path = os.path.join(USER_DATA_DIR, username, 'user_data.yaml')
+    user_config_path = _user_cfg_path(username)
     
-    if not os.path.exists(user_config_path):
-        return jsonify({"status": "error", "message": "用户配置不存在"})
+    if not user_exists(username):
+        return error_response("用户配置不存在")
     
     try:
-        with open(user_config_path, 'r', encoding='utf-8') as f:
-            user_config = yaml.safe_load(f)
+        user_config = load_yaml(user_config_path)
         
         buff_cookies = user_config.get('buff_cookies', '')
         return jsonify({"status": "success", "cookie": buff_cookies})
@@ -213,26 +305,29 @@ def api_get_cookie():
 
 @app.route('/api/update_cookie', methods=['POST'])
 def api_update_cookie():
-    data = request.json
+    data = get_json()
     username = data.get('username')
     buff_cookies = data.get('buff_cookies')
     
     if not username or not buff_cookies:
-        return jsonify({"status": "error", "message": "缺少必要参数"})
+        return error_response("缺少必要参数")
     
-    user_config_path = os.path.join(USER_DATA_DIR, username, 'user_data.yaml')
+    user_config_path = _user_cfg_path(username)
     
-    if not os.path.exists(user_config_path):
-        return jsonify({"status": "error", "message": "用户配置不存在"})
+    if not user_exists(username):
+        return error_response("用户配置不存在")
     
     try:
-        with open(user_config_path, 'r', encoding='utf-8') as f:
-            user_config = yaml.safe_load(f)
-        
-        user_config['buff_cookies'] = buff_cookies
-        
-        with open(user_config_path, 'w', encoding='utf-8') as f:
-            yaml.dump(user_config, f, default_flow_style=False, allow_unicode=True)
+        with path_lock(user_config_path):
+            user_config = load_yaml(user_config_path)
+            
+            # Cookie 未变化时无需重写整个配置文件
+            if user_config.get('buff_cookies') == buff_cookies:
+                return jsonify({"status": "success", "message": "Cookie更新成功"})
+            
+            user_config['buff_cookies'] = buff_cookies
+            
+            dump_yaml(user_config_path, user_config, fsync=True, default_flow_style=False, allow_unicode=True)
         
         return jsonify({"status": "success", "message": "Cookie更新成功"})
     except Exception as e:
@@ -240,7 +335,7 @@ def api_update_cookie():
 
 @app.route('/api/add_query', methods=['POST'])
 def api_add_query():
-    data = request.json
+    data = get_json()
     username = data.get('username')
     goods_id = data.get('goods_id')
     game = data.get('game', 'dota2')
@@ -249,20 +344,19 @@ def api_add_query():
     sort_by = data.get('sort_by', 'price.asc')
     
     if not username or not goods_id:
-        return jsonify({"status": "error", "message": "缺少必要参数"})
+        return error_response("缺少必要参数")
     
     try:
         # 从用户配置中获取cookie
-        user_config_path = os.path.join(USER_DATA_DIR, username, 'user_data.yaml')
-        if not os.path.exists(user_config_path):
-            return jsonify({"status": "error", "message": "用户配置不存在"})
+        user_config_path = _user_cfg_path(username)
+        if not user_exists(username):
+            return error_response("用户配置不存在")
             
-        with open(user_config_path, 'r', encoding='utf-8') as f:
-            user_config = yaml.safe_load(f)
+        user_config = load_yaml(user_config_path)
         
         buff_cookies = user_config.get('buff_cookies', '')
         if not buff_cookies:
-            return jsonify({"status": "error", "message": "请先在Cookie设置中设置Buff Cookie"})
+            return error_response("请先在Cookie设置中设置Buff Cookie")
             
         # 使用QueryInput类添加查询
         query_input = QueryInput()
@@ -289,16 +383,15 @@ def api_get_watchlist():
     username = request.args.get('username')
     
     if not username:
-        return jsonify({"status": "error", "message": "缺少用户名参数"})
+        return error_response("缺少用户名参数")
     
     try:
         # 读取用户数据文件
-        user_data_path = os.path.join(USER_DATA_DIR, username, 'user_data.yaml')
-        if not os.path.exists(user_data_path):
-            return jsonify({"status": "error", "message": "用户数据不存在"})
+        user_data_path = _user_cfg_path(username)
+        if not user_exists(username):
+            return error_response("用户数据不存在")
         
-        with open(user_data_path, 'r', encoding='utf-8') as f:
-            user_data = yaml.safe_load(f)
+        user_data = load_yaml(user_data_path)
         
         # 获取监视列表
         watchlist = user_data.get('watchlist', {})
@@ -306,140 +399,156 @@ def api_get_watchlist():
     except Exception as e:
         return jsonify({"status": "error", "message": f"获取监视列表失败: {str(e)}"})
 
+# 一次读取、批量删除、一次写回；返回未找到的监视项 ID 列表
+def _delete_watchlist_items(username: str, item_ids: list) -> list:
+    user_data_path = _user_cfg_path(username)
+    with path_lock(user_data_path):
+        user_data = load_yaml(user_data_path)
+        watchlist = user_data.get('watchlist') or {}
+        missing = [i for i in item_ids if i not in watchlist]
+        if len(missing) == len(item_ids):
+            return missing
+        for item_id in item_ids:
+            watchlist.pop(item_id, None)
+        user_data['watchlist'] = watchlist
+        
+        # 保存更新后的用户数据（临时文件 + fsync + os.replace）
+        dump_yaml(user_data_path, user_data, fsync=True, default_flow_style=False, allow_unicode=True)
+    return missing
+
 @app.route('/api/delete_watchlist_item', methods=['POST'])
 def api_delete_watchlist_item():
-    data = request.json
+    data = get_json()
     username = data.get('username')
     item_id = data.get('item_id')
     
     if not username or not item_id:
-        return jsonify({"status": "error", "message": "缺少必要参数"})
+        return error_response("缺少必要参数")
     
     try:
-        # 读取用户数据文件
-        user_data_path = os.path.join(USER_DATA_DIR, username, 'user_data.yaml')
-        if not os.path.exists(user_data_path):
-            return jsonify({"status": "error", "message": "用户数据不存在"})
+        if not user_exists(username):
+            return error_response("用户数据不存在")
         
-        with open(user_data_path, 'r', encoding='utf-8') as f:
-            user_data = yaml.safe_load(f)
+        if _delete_watchlist_items(username, [item_id]):
+            return error_response("监视项不存在")
         
-        # 删除监视列表项
-        watchlist = user_data.get('watchlist', {})
-        if item_id in watchlist:
-            del watchlist[item_id]
-            user_data['watchlist'] = watchlist
-            
-            # 保存更新后的用户数据
-            with open(user_data_path, 'w', encoding='utf-8') as f:
-                yaml.dump(user_data, f, default_flow_style=False, allow_unicode=True)
-            
-            return jsonify({"status": "success", "message": "成功删除监视项"})
-        else:
-            return jsonify({"status": "error", "message": "监视项不存在"})
+        return jsonify({"status": "success", "message": "成功删除监视项"})
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"删除监视项失败: {str(e)}"})
+
+@app.route('/api/delete_watchlist_items', methods=['POST'])
+def api_delete_watchlist_items():
+    data = get_json()
+    username = data.get('username')
+    item_ids = data.get('item_ids')
+    
+    if not username or not item_ids or not isinstance(item_ids, list):
+        return error_response("缺少必要参数")
+    
+    try:
+        if not user_exists(username):
+            return error_response("用户数据不存在")
+        
+        missing = _delete_watchlist_items(username, item_ids)
+        if len(missing) == len(item_ids):
+            return jsonify({"status": "error", "message": "监视项不存在", "missing": missing})
+        
+        return jsonify({
+            "status": "success",
+            "message": f"成功删除 {len(item_ids) - len(missing)} 个监视项",
+            "missing": missing
+        })
     except Exception as e:
         return jsonify({"status": "error", "message": f"删除监视项失败: {str(e)}"})
 
 @app.route('/api/search_by_name', methods=['POST'])
 def api_search_by_name():
-    data = request.json or {}
+    data = get_json()
     username = data.get('username')
     keyword = data.get('keyword')
     game = data.get('game', 'dota2')
     limit = int(data.get('limit', 10))
 
     if not username or not keyword:
-        return jsonify({"status": "error", "message": "缺少必要参数: username 或 keyword"})
+        return error_response("缺少必要参数: username 或 keyword")
 
     # 读取用户配置以获取 Cookie
-    user_config_path = os.path.join(USER_DATA_DIR, username, 'user_data.yaml')
-    if not os.path.exists(user_config_path):
-        return jsonify({"status": "error", "message": "用户配置不存在"})
+    user_config_path = _user_cfg_path(username)
+    if not user_exists(username):
+        return error_response("用户配置不存在")
 
     try:
-        with open(user_config_path, 'r', encoding='utf-8') as f:
-            user_config = yaml.safe_load(f)
+        user_config = load_yaml(user_config_path)
         buff_cookies = user_config.get('buff_cookies', '')
         if not buff_cookies:
-            return jsonify({"status": "error", "message": "请先在Cookie设置中设置Buff Cookie"})
+            return error_response("请先在Cookie设置中设置Buff Cookie")
 
         # 调用 Buff API 搜索
-        buff = BuffAccount(buffcookie=buff_cookies)
+        buff = _buff_account(buff_cookies)
         items = buff.search_goods_list(key=keyword, game_name=game) or []
-        print(f"Search results for user {username}, keyword '{keyword}': {items}")
         SHARED_CACHE_MANAGER.upsert_cache(items)
         # 规范为列表
         if isinstance(items, dict):
             items = items.get('items', [])
-        # 取前 limit 项并简化
-        simplified = [_simplify_item(it) for it in items[:limit]]
+        log.debug('Search results for user %s keyword %r: %d items', username, keyword, len(items))
+        # 取前 limit 项并简化，同一遍循环中生成名称列表与名称->ID 索引
+        # 名称->ID 索引用于添加时 O(1) 查找；同名时保留第一条，与原先的顺序扫描一致
+        simplified, name_list, name_to_id = [], [], {}
+        for it in items[:limit]:
+            item = _simplify_item(it)
+            simplified.append(item)
+            name = item['name']
+            if name:
+                name_list.append(name)
+                if item['id']:
+                    name_to_id.setdefault(name, item['id'])
         # 缓存最近搜索结果用于后续名称->ID映射
-        recent_search_cache[username] = {
+        set_recent(username, {
             'keyword': keyword,
             'game': game,
-            'items': simplified
-        }
+            'items': simplified,
+            'name_to_id': name_to_id
+        })
         # 返回仅名称列表（按需求），但内部已缓存映射
-        name_list = [it['name'] for it in simplified if it.get('name')]
         return jsonify({"status": "success", "names": name_list})
     except Exception as e:
         return jsonify({"status": "error", "message": f"搜索失败: {str(e)}"})
 
 @app.route('/api/add_watchlist_by_name', methods=['POST'])
 def api_add_watchlist_by_name():
-    data = request.json or {}
+    data = get_json()
     username = data.get('username')
     selected_name = data.get('selected_name')
     # 允许前端指定 game，否则尝试沿用最近搜索，最后回落到 'dota2'
-    game = data.get('game') or (recent_search_cache.get(username, {}).get('game')) or 'dota2'
+    game = data.get('game') or (get_recent(username) or {}).get('game') or 'dota2'
     price_min = data.get('price_min')
     price_max = data.get('price_max')
     sort_by = data.get('sort_by', 'price.asc')
 
     if not username or not selected_name:
-        return jsonify({"status": "error", "message": "缺少必要参数: username 或 selected_name"})
+        return error_response("缺少必要参数: username 或 selected_name")
 
     # 读取用户配置以获取 Cookie
-    user_config_path = os.path.join(USER_DATA_DIR, username, 'user_data.yaml')
-    if not os.path.exists(user_config_path):
-        return jsonify({"status": "error", "message": "用户配置不存在"})
+    user_config_path = _user_cfg_path(username)
+    if not user_exists(username):
+        return error_response("用户配置不存在")
 
     try:
-        with open(user_config_path, 'r', encoding='utf-8') as f:
-            user_config = yaml.safe_load(f)
+        user_config = load_yaml(user_config_path)
         buff_cookies = user_config.get('buff_cookies', '')
         if not buff_cookies:
-            return jsonify({"status": "error", "message": "请先在Cookie设置中设置Buff Cookie"})
+            return error_response("请先在Cookie设置中设置Buff Cookie")
 
         # 1) 先从最近缓存里找名称->ID
-        goods_id = None
-        cached = recent_search_cache.get(username)
-        if cached and isinstance(cached.get('items'), list):
-            for it in cached['items']:
-                # 与返回给前端的名称一致的匹配逻辑
-                if it.get('name') == selected_name and it.get('id'):
-                    goods_id = it['id']
-                    break
+        cached = get_recent(username) or {}
+        goods_id = cached.get('name_to_id', {}).get(selected_name)
 
         # 2) 若未命中或缓存不存在，回退到实时搜索
         if not goods_id:
-            buff = BuffAccount(buffcookie=buff_cookies)
-            items = buff.search_goods_list(key=selected_name, game_name=game) or []
-            if isinstance(items, dict):
-                items = items.get('items', [])
-            for it in items:
-                name = it.get('name') or it.get('market_hash_name') or it.get('short_name')
-                if name == selected_name and it.get('id') is not None:
-                    goods_id = str(it['id'])
-                    break
-            # 如果仍未找到，退一步：选择第一条结果
-            if not goods_id and items:
-                first = items[0]
-                if first.get('id') is not None:
-                    goods_id = str(first['id'])
+            goods_id = _resolve_goods_id(_buff_account(buff_cookies), selected_name, game)
 
         if not goods_id:
-            return jsonify({"status": "error", "message": "未能解析所选名称对应的商品ID"})
+            return error_response("未能解析所选名称对应的商品ID")
 
         # 3) 调用现有逻辑写入 watchlist
         query_input = QueryInput()
@@ -465,4 +574,10 @@ def api_add_watchlist_by_name():
 if __name__ == '__main__':
     # 确保用户数据目录存在
     os.makedirs(USER_DATA_DIR, exist_ok=True)
-    app.run(debug=True, port=5002)
\ No newline at end of file
+    # 使用多线程 WSGI 服务器并发处理请求；未安装 waitress 时退回 Flask 自带服务器
+    try:
+        from waitress import serve
+    except ImportError:
+        app.run(port=5002, threaded=True)
+    else:
+        serve(app, host='127.0.0.1', port=5002, threads=16)
\ No newline at end of file